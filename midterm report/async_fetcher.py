@@ -0,0 +1,254 @@
+"""
+异步HTTP抓取引擎
+共享连接池（keep-alive复用）、按主机限制并发数、非阻塞退避重试
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import HTTP_MAX_CONNECTIONS, HTTP_MAX_PER_HOST, HTTP_TIMEOUT, DOWNLOAD_CHUNK_SIZE
+from rate_limiter import get_rate_limiter
+import metrics
+from utils import get_random_header, get_random_proxy, sha256_of_file
+
+
+def run_sync(coro):
+    """在同步代码中运行协程（兼容已有事件循环的环境，如Jupyter）"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # 当前线程已有运行中的事件循环，放到独立线程中执行
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+class AsyncFetcher:
+    """异步抓取器：一个ClientSession复用全部连接，按主机限制在途请求数，请求速率由共享限速器控制"""
+
+    def __init__(self, max_connections=HTTP_MAX_CONNECTIONS, max_per_host=HTTP_MAX_PER_HOST,
+                 timeout=HTTP_TIMEOUT, max_retries=3, limiter=None):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limiter = limiter or get_rate_limiter()
+        self._session = None
+        self._host_semaphores = {}
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """创建连接池（需在事件循环内调用）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_per_host,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=get_random_header(),
+            )
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _host_semaphore(self, url):
+        """获取主机对应的并发信号量"""
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_per_host)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    @staticmethod
+    def _pick_proxy(url):
+        """将requests风格的代理字典转换为aiohttp的代理地址"""
+        proxies = get_random_proxy()
+        if not proxies:
+            return None
+        return proxies.get(urlsplit(url).scheme)
+
+    async def _request(self, url, reader, method="get", **kwargs):
+        """带重试的请求，成功时返回reader(response)的结果，失败返回None"""
+        await self.open()
+        kwargs.setdefault("proxy", self._pick_proxy(url))
+
+        for i in range(self.max_retries):
+            await self.limiter.acquire_async(url)
+            try:
+                async with self._host_semaphore(url):
+                    start = time.perf_counter()
+                    async with self._session.request(method, url, **kwargs) as response:
+                        status = response.status
+                        if status == 200:
+                            result = await reader(response)
+                latency = time.perf_counter() - start
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.limiter.feedback(url, error=True)
+                metrics.inc('http_requests_total', host=urlsplit(url).netloc, status='error')
+                print(f"请求异常 [{str(e) or type(e).__name__}]，重试第{i+1}次...")
+                continue
+
+            metrics.observe('http_request_seconds', latency, host=urlsplit(url).netloc)
+            metrics.inc('http_requests_total', host=urlsplit(url).netloc, status=status)
+            if status == 200:
+                text = result if isinstance(result, str) else None
+                if not self.limiter.feedback(url, status=status, latency=latency, text=text):
+                    return result
+                print(f"请求被拦截 [验证页]，重试第{i+1}次...")
+            else:
+                self.limiter.feedback(url, status=status, latency=latency)
+                print(f"请求失败 [状态码: {status}]，重试第{i+1}次...")
+        return None
+
+    @staticmethod
+    async def _read_text(response):
+        body = await response.read()
+        return body.decode(response.charset or "utf-8", errors="replace")
+
+    @staticmethod
+    async def _read_bytes(response):
+        return await response.read()
+
+    async def fetch_text(self, url, **kwargs):
+        """获取页面文本，失败返回None"""
+        return await self._request(url, self._read_text, **kwargs)
+
+    async def fetch_bytes(self, url, **kwargs):
+        """获取二进制内容（如PDF），失败返回None"""
+        return await self._request(url, self._read_bytes, **kwargs)
+
+    async def fetch_all_text(self, urls, **kwargs):
+        """并发获取多个页面文本，结果与urls顺序一致"""
+        return await asyncio.gather(*(self.fetch_text(url, **kwargs) for url in urls))
+
+    async def download(self, url, filepath, chunk_size=DOWNLOAD_CHUNK_SIZE, magic=None, **kwargs):
+        """
+        流式下载文件：分块写入 filepath.part，完成后原子重命名
+        已有部分文件时通过HTTP Range续传；返回 {'path', 'sha256', 'size'}，失败返回None
+        magic: 文件头（如 b"%PDF"），从头下载时校验，返回HTML页面（验证页、登录页）或文件头不符时
+               视为被拦截：主机限速并丢弃部分文件
+        """
+        await self.open()
+        kwargs.setdefault("proxy", self._pick_proxy(url))
+        # 大文件不限制总时长，只限制连接和单次读取的等待时间
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout))
+        base_headers = kwargs.pop("headers", None) or {}
+        part_path = filepath + ".part"
+
+        for i in range(self.max_retries):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            hasher = sha256_of_file(part_path) if offset else hashlib.sha256()
+            headers = dict(base_headers)
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+
+            await self.limiter.acquire_async(url)
+            try:
+                async with self._host_semaphore(url):
+                    start = time.perf_counter()
+                    async with self._session.get(url, headers=headers, **kwargs) as response:
+                        status = response.status
+                        self.limiter.feedback(url, status=status, latency=time.perf_counter() - start)
+                        if status in (200, 206):
+                            if status == 200 and offset:
+                                # 服务器不支持续传，从头下载
+                                offset = 0
+                                hasher = hashlib.sha256()
+                            head = await self._read_head(response, len(magic)) if magic and not offset else b""
+                            if magic and not offset and not self._is_expected_file(response, head, magic):
+                                self.limiter.host_limiter(url).on_throttle()
+                                if os.path.exists(part_path):
+                                    os.remove(part_path)
+                                print(f"下载内容不是预期文件 [{response.content_type}]，重试第{i+1}次...")
+                                continue
+                            with open(part_path, "ab" if offset else "wb") as f:
+                                f.write(head)
+                                hasher.update(head)
+                                offset += len(head)
+                                async for chunk in response.content.iter_chunked(chunk_size):
+                                    f.write(chunk)
+                                    hasher.update(chunk)
+                                    offset += len(chunk)
+
+                # 416表示续传起点已到文件末尾，部分文件即为完整文件
+                if status in (200, 206) or (status == 416 and offset):
+                    os.replace(part_path, filepath)
+                    return {"path": filepath, "sha256": hasher.hexdigest(), "size": offset}
+                print(f"下载失败 [状态码: {status}]，重试第{i+1}次...")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.limiter.feedback(url, error=True)
+                print(f"下载中断 [{str(e) or type(e).__name__}]，已保存{offset}字节，重试第{i+1}次...")
+        return None
+
+    @staticmethod
+    async def _read_head(response, size):
+        """读取响应开头的size个字节（响应不足size字节时返回全部内容）"""
+        try:
+            return await response.content.readexactly(size)
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+
+    @staticmethod
+    def _is_expected_file(response, head, magic):
+        return response.content_type != "text/html" and head.startswith(magic)
+
+
+class FetcherThread:
+    """在后台线程的事件循环中运行共享的AsyncFetcher，供线程池中的同步任务复用同一个连接池"""
+
+    def __init__(self, **fetcher_kwargs):
+        self.fetcher = AsyncFetcher(**fetcher_kwargs)
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="fetcher-loop", daemon=True)
+                self._thread.start()
+                self.run(self.fetcher.open())
+        return self
+
+    def run(self, coro):
+        """在后台事件循环中执行协程并阻塞等待结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def fetch_text(self, url, **kwargs):
+        return self.run(self.fetcher.fetch_text(url, **kwargs))
+
+    def download(self, url, filepath, **kwargs):
+        return self.run(self.fetcher.download(url, filepath, **kwargs))
+
+    def close(self):
+        """关闭连接池并停止后台事件循环"""
+        with self._lock:
+            if self._thread is None:
+                return
+            self.run(self.fetcher.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
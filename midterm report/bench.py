@@ -0,0 +1,618 @@
+"""
+离线基准测试
+本地HTTP服务器模拟东方财富的股吧列表、帖子评论、资讯检索、研报检索页面，并提供 data/研报PDF 中的样例PDF；
+用mongomock替代MongoDB运行爬虫与解析器，输出 pages/s、docs/s、峰值内存和各阶段耗时，
+无需联网即可对比每次改动前后的性能
+mongomock的upsert随集合增大而变慢，各阶段另列出MongoDB写入耗时（写入(s)），对比抓取性能时应扣除
+
+用法：
+    python bench.py                          # HTTP发帖 / 评论 / 资讯 / 研报下载 + 解析器基准
+    python bench.py --selenium               # 额外用本机Chrome运行PostCrawler / ReportCrawler / CommentCrawler
+    python bench.py --stocks 5 --pages 10 --json data/metrics/bench.json
+
+另在新进程中测量 utils / crawlers / main 的冷启动导入耗时，并列出被加载的重型依赖
+"""
+
+import argparse
+import asyncio
+import csv
+import glob
+import html
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import config
+import crawlers
+import metrics
+import mongodb
+from async_fetcher import AsyncFetcher, run_sync
+from config import STOCK_LIST, URL_TEMPLATES, DATA_DIR, REPORT_PDF_DIR, COMMENT_PAGE_SIZE
+from crawlers import (PostCrawler, HttpPostCrawler, CommentCrawler, HttpCommentCrawler, ReportCrawler,
+                      crawl_news_for_stocks)
+from parser_util import PostParser, CommentParser, ReportParser, NewsParser
+from rate_limiter import get_rate_limiter
+
+# STOCK_LIST之外可选用的股票（data/研报PDF中有样例PDF）
+_EXTRA_STOCKS = [("300750", "宁德时代"), ("601899", "紫金矿业")]
+_BASE_DATE = date(2025, 11, 16)
+_NEWS_SOURCES = ("东方财富网", "证券时报", "上海证券报", "财联社")
+
+
+def _read_titles(filename, column='标题'):
+    """读取已爬取的CSV中的标题作为页面文本来源，文件不存在时返回空列表"""
+    path = os.path.join(DATA_DIR, filename)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return [row[column] for row in csv.DictReader(f) if row.get(column)]
+
+
+def bench_stocks(count):
+    """取count只股票：先用配置中的股票，不足时补充"""
+    stocks = list(STOCK_LIST) + [s for s in _EXTRA_STOCKS if s not in STOCK_LIST]
+    for n in range(len(stocks), count):
+        stocks.append((f"9{n:05d}", f"测试股票{n}"))
+    return stocks[:count]
+
+
+class Fixtures(object):
+    """按请求生成与线上页面结构一致的HTML，内容取自data目录下已爬取的标题"""
+
+    def __init__(self, stocks, rows_per_page=80, comments_per_page=COMMENT_PAGE_SIZE, news_per_page=20,
+                 reports_per_page=10):
+        self.stocks = dict(stocks)
+        self.codes_by_name = {name: code for code, name in stocks}
+        self.rows_per_page = rows_per_page
+        self.comments_per_page = comments_per_page
+        self.news_per_page = news_per_page
+        self.reports_per_page = reports_per_page
+        self.post_titles = _read_titles('股吧标题.csv') or [f"测试帖子标题{i}" for i in range(100)]
+        self.news_titles = _read_titles('股票新闻.csv') or [f"测试资讯标题{i}" for i in range(100)]
+        self.pdfs = {code: self._find_pdfs(name) for code, name in stocks}
+        self.base_url = ''
+
+    @staticmethod
+    def _find_pdfs(stock_name):
+        pdfs = sorted(glob.glob(os.path.join(REPORT_PDF_DIR, stock_name, '*.pdf')))
+        return pdfs or sorted(glob.glob(os.path.join(REPORT_PDF_DIR, '*', '*.pdf')))
+
+    def _post_id(self, page, i):
+        # 越靠前的页帖子ID越大，与线上按发帖时间倒序一致
+        return str(9000000000 - (page - 1) * self.rows_per_page - i)
+
+    @staticmethod
+    def _comment_count(post_id):
+        # 0~90条，覆盖无评论、单页和多页评论的帖子
+        return (9000000000 - int(post_id)) * 17 % 91
+
+    def _post_date(self, page, i):
+        return _BASE_DATE - timedelta(days=((page - 1) * self.rows_per_page + i) // 40)
+
+    @lru_cache(maxsize=1024)
+    def post_list(self, stock_code, page):
+        rows, articles = [], []
+        for i in range(self.rows_per_page):
+            post_id = self._post_id(page, i)
+            title = self.post_titles[(page * self.rows_per_page + i) % len(self.post_titles)]
+            post_date = self._post_date(page, i).isoformat()
+            post_time = f"{(i * 7) % 24:02d}:{(i * 13) % 60:02d}"
+            rows.append(
+                f'<tr class="listitem"><td><div class="l1 read">{i * 11}</div></td>'
+                f'<td><div class="l7"><span>{self._comment_count(post_id)}</span></div></td>'
+                f'<td><div class="l3 title"><a href="/news,{stock_code},{post_id}.html">{html.escape(title)}</a></div></td>'
+                f'<td><div class="l4 author"><a href="//i.eastmoney.com/{i}">股友{i:04d}</a></div></td>'
+                f'<td><div class="l5 update">{post_date}</div></td>'
+                f'<td><div class="l6">{post_time}</div></td>'
+                f'<td><div class="l8"><span>{i % 5}</span></div></td></tr>'
+            )
+            articles.append({
+                'post_id': int(post_id),
+                'post_title': title,
+                'user_nickname': f"股友{i:04d}",
+                'post_publish_time': f"{post_date} {post_time}:00",
+                'post_comment_count': self._comment_count(post_id),
+                'post_like_count': i % 5,
+                'post_click_count': i * 11,
+            })
+        article_list = json.dumps({'re': articles, 'count': len(articles)}, ensure_ascii=False)
+        return (
+            f'<html><head><title>{stock_code}股吧</title></head><body>'
+            f'<table class="default_list"><thead><tr><th>阅读</th></tr></thead><tbody>{"".join(rows)}</tbody></table>'
+            f'<script>var article_list = {article_list};</script></body></html>'
+        )
+
+    @lru_cache(maxsize=1024)
+    def comment_page(self, stock_code, post_id, page=1):
+        items = []
+        total = self._comment_count(post_id)
+        for i in range((page - 1) * self.comments_per_page, min(total, page * self.comments_per_page)):
+            content = self.post_titles[(int(post_id) + i) % len(self.post_titles)]
+            items.append(
+                f'<div class="article-item"><div class="user_name"><a href="#">评论用户{i}</a></div>'
+                f'<div class="t_content">{html.escape(content)}</div>'
+                f'<div class="pub_time">{_BASE_DATE.isoformat()} {i % 24:02d}:{i % 60:02d}</div>'
+                f'<div class="zan"><b>{i % 7}</b></div></div>'
+            )
+        return f'<html><body><div id="comment_all_content">{"".join(items)}</div></body></html>'
+
+    @lru_cache(maxsize=1024)
+    def news_page(self, stock_name, page):
+        items = []
+        for i in range(self.news_per_page):
+            n = (page - 1) * self.news_per_page + i
+            title = html.escape(self.news_titles[n % len(self.news_titles)])
+            title = title.replace(html.escape(stock_name), f'<em>{html.escape(stock_name)}</em>', 1)
+            url = f"http://finance.eastmoney.com/a/2025{n:010d}.html"
+            news_time = f"{(_BASE_DATE - timedelta(days=n // 10)).isoformat()} {n % 24:02d}:00:00"
+            items.append(
+                f'<li><div class="news_item"><div class="news_item_t" style=""><a href="{url}" target="_blank">{title}</a></div>'
+                f'<div class="news_item_c"><span class="news_item_time">{news_time} - </span>'
+                f'<span class="news_item_source">{html.escape(_NEWS_SOURCES[n % len(_NEWS_SOURCES)])}</span>'
+                f'<span>东方财富网讯，{title}相关内容摘要……</span></div>'
+                f'<div class="news_item_url" style=""><a href="{url}" target="_blank">{url}</a></div></div></li>'
+            )
+        return f'<html><body><ul class="news_list">{"".join(items)}</ul></body></html>'
+
+    def report_entries(self, stock_code, page):
+        """第page页研报的(标题, 链接)"""
+        pdfs = self.pdfs.get(stock_code) or []
+        entries = []
+        for k in range((page - 1) * self.reports_per_page, min(page * self.reports_per_page, len(pdfs))):
+            title = os.path.splitext(os.path.basename(pdfs[k]))[0]
+            entries.append((title, f"{self.base_url}/pdf/{stock_code}/{k}.pdf"))
+        return entries
+
+    @lru_cache(maxsize=1024)
+    def report_page(self, stock_name, page):
+        code = self.codes_by_name.get(stock_name)
+        items = [
+            f'<li><div class="notice_item_t"><a class="title" href="{url}">{html.escape(title)}</a></div>'
+            f'<span class="time">{_BASE_DATE.isoformat()}</span><a class="pdf" href="{url}">PDF</a></li>'
+            for title, url in self.report_entries(code, page)
+        ]
+        return f'<html><body><ul class="yb_list">{"".join(items)}</ul></body></html>'
+
+    def pdf_path(self, stock_code, index):
+        pdfs = self.pdfs.get(stock_code) or []
+        return pdfs[index] if 0 <= index < len(pdfs) else None
+
+
+_ROUTES = [
+    ('post_list', re.compile(r'^/list,(\w+?)(?:_(\d+))?\.html$')),
+    ('comment', re.compile(r'^/news,(\w+),(\d+)(?:_(\d+))?\.html$')),
+    ('report_search', re.compile(r'^/Yanbao/s$')),
+    ('news_search', re.compile(r'^/News/s$')),
+    ('pdf', re.compile(r'^/pdf/(\w+)/(\d+)\.pdf$')),
+]
+
+
+class FixtureServer(object):
+    """在后台线程运行的本地HTTP服务器，按页面类型统计请求数"""
+
+    def __init__(self, fixtures, host='127.0.0.1', port=0):
+        self.fixtures = fixtures
+        self.counts = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        fixtures.base_url = self.base_url
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def total_requests(self):
+        with self._lock:
+            return sum(self.counts.values())
+
+    def url_templates(self):
+        return {
+            "bar": f"{self.base_url}/list,{{stock_code}}.html",
+            "bar_page": f"{self.base_url}/list,{{stock_code}}_{{page}}.html",
+            "post": f"{self.base_url}/news,{{stock_code}},{{post_id}}.html",
+            "post_page": f"{self.base_url}/news,{{stock_code}},{{post_id}}_{{page}}.html",
+            "report": f"{self.base_url}/Yanbao/s?keyword={{stock_name}}",
+            "news": f"{self.base_url}/News/s?keyword={{stock_name}}",
+        }
+
+    def handle(self, request):
+        parts = urlsplit(request.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        for kind, pattern in _ROUTES:
+            match = pattern.match(parts.path)
+            if match:
+                break
+        else:
+            request.send_error(404)
+            return
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+        f = self.fixtures
+        if kind == 'post_list':
+            page = int(match.group(2) or query.get('page', 1))
+            body = f.post_list(match.group(1), page)
+        elif kind == 'comment':
+            body = f.comment_page(match.group(1), match.group(2), int(match.group(3) or 1))
+        elif kind == 'report_search':
+            body = f.report_page(query.get('keyword', ''), int(query.get('pageindex', 1)))
+        elif kind == 'news_search':
+            body = f.news_page(query.get('keyword', ''), int(query.get('pageindex', 1)))
+        else:
+            self._send_pdf(request, f.pdf_path(match.group(1), int(match.group(2))))
+            return
+        data = body.encode('utf-8')
+        request.send_response(200)
+        request.send_header('Content-Type', 'text/html; charset=utf-8')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    @staticmethod
+    def _send_pdf(request, path):
+        """返回PDF文件，支持 Range: bytes=N- 续传"""
+        if path is None:
+            request.send_error(404)
+            return
+        with open(path, 'rb') as pdf:
+            data = pdf.read()
+        match = re.match(r'bytes=(\d+)-$', request.headers.get('Range', ''))
+        offset = int(match.group(1)) if match else 0
+        if offset >= len(data) and match:
+            request.send_response(416)
+            request.end_headers()
+            return
+        request.send_response(206 if match else 200)
+        request.send_header('Content-Type', 'application/pdf')
+        request.send_header('Content-Length', str(len(data) - offset))
+        if match:
+            request.send_header('Content-Range', f"bytes {offset}-{len(data) - 1}/{len(data)}")
+        request.end_headers()
+        request.wfile.write(data[offset:])
+
+
+@contextmanager
+def offline_environment(server, pdf_dir):
+    """把URL模板指向本地服务器、用mongomock替代MongoDB、研报PDF写入临时目录，退出时恢复"""
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("离线基准测试需要mongomock：pip install mongomock")
+
+    saved_templates = dict(URL_TEMPLATES)
+    saved_pdf_dir = crawlers.REPORT_PDF_DIR
+    URL_TEMPLATES.update(server.url_templates())
+    crawlers.REPORT_PDF_DIR = pdf_dir
+    mongodb.close_clients()
+    mongodb._clients[('localhost', 27017)] = mongomock.MongoClient()
+    # 本地服务器不需要限速
+    get_rate_limiter().configure(server.base_url, rate=1e9, burst=1e9, max_rate=1e9)
+    metrics.get_registry().reset()
+    try:
+        yield
+    finally:
+        URL_TEMPLATES.clear()
+        URL_TEMPLATES.update(saved_templates)
+        crawlers.REPORT_PDF_DIR = saved_pdf_dir
+        mongodb.close_clients()
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存（MB），无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 / 1024
+        except (ImportError, AttributeError):
+            return None
+
+
+def _count_docs():
+    database = mongodb.get_client()['stock_sentiment']
+    return sum(database[name].count_documents({}) for name in database.list_collection_names()
+               if name != 'crawl_state')
+
+
+def _mongo_write_seconds():
+    return sum(histogram['sum'] for histogram in metrics.get_registry().to_dict()['histograms']
+               if histogram['name'] == 'mongo_write_seconds')
+
+
+def run_stage(results, server, name, fn):
+    """运行一个阶段并记录耗时、MongoDB写入耗时、请求页数与新增文档数"""
+    pages_before, docs_before, write_before = server.total_requests(), _count_docs(), _mongo_write_seconds()
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        print(f"[Bench] 阶段 {name} 异常: {str(e)}")
+    elapsed = time.perf_counter() - start
+    pages, docs = server.total_requests() - pages_before, _count_docs() - docs_before
+    results.append({
+        'stage': name,
+        'seconds': elapsed,
+        'write_seconds': _mongo_write_seconds() - write_before,
+        'pages': pages,
+        'docs': docs,
+        'pages_per_sec': pages / elapsed if elapsed else 0.0,
+        'docs_per_sec': docs / elapsed if elapsed else 0.0,
+    })
+
+
+def bench_http_posts(stocks, pages):
+    for stock_code, _ in stocks:
+        crawler = HttpPostCrawler(stock_code)
+        try:
+            crawler.crawl_post_info(pages=pages)
+        finally:
+            crawler.cleanup()
+
+
+def bench_http_comments(stocks):
+    """对已入库的全部发帖并发爬取评论（多页评论逐页翻到最后一页）"""
+    for stock_code, _ in stocks:
+        crawler = HttpCommentCrawler(stock_code)
+        try:
+            crawler.crawl_comments(crawler.find_by_date('0000-00-00', '9999-99-99'))
+        finally:
+            crawler.cleanup()
+
+
+def bench_news(stocks, pages):
+    run_sync(crawl_news_for_stocks(stocks, pages=pages))
+
+
+def bench_report_downloads(stocks, pages):
+    """从研报检索页提取PDF链接后并发下载（不经过浏览器）"""
+    async def _run():
+        async with AsyncFetcher() as fetcher:
+            for stock_code, stock_name in stocks:
+                search_url = URL_TEMPLATES['report'].format(stock_name=stock_name)
+                html_list = await fetcher.fetch_all_text(
+                    [f"{search_url}&pageindex={page}" for page in range(1, pages + 1)])
+                urls = [url for page_html in html_list if page_html for url in ReportParser.extract_pdf_url(page_html)]
+                reports = [(f"{stock_name}_{os.path.basename(url)[:-4]}", url) for url in dict.fromkeys(urls)]
+                crawler = ReportCrawler(stock_code, stock_name)
+                try:
+                    await crawler.download_reports_async(fetcher, reports)
+                finally:
+                    crawler.cleanup()
+    run_sync(_run())
+
+
+def bench_selenium(stocks, pages, comment_posts=5):
+    """用本机Chrome（无头）运行基于浏览器的爬虫"""
+    from browser_pool import BrowserPool
+    pool = BrowserPool(size=1, headless=True)
+    try:
+        for stock_code, stock_name in stocks:
+            post_crawler = PostCrawler(stock_code, pool=pool)
+            try:
+                post_crawler.crawl_post_info(pages=pages)
+            finally:
+                post_crawler.cleanup()
+
+            comment_crawler = CommentCrawler(stock_code, pool=pool)
+            try:
+                posts = [post for post in comment_crawler.find_by_date('0000-00-00', '9999-99-99')
+                         if post.get('post_id')]
+                for post in posts[:comment_posts]:
+                    post_url = URL_TEMPLATES['post'].format(stock_code=stock_code, post_id=post['post_id'])
+                    comment_crawler.crawl_comment_info(post_url, post['post_id'])
+            finally:
+                comment_crawler.cleanup()
+
+            report_crawler = ReportCrawler(stock_code, stock_name, pool=pool)
+            try:
+                report_crawler.crawl_stock_reports(pages=pages)
+            finally:
+                report_crawler.cleanup()
+    finally:
+        pool.close()
+
+
+# 只在浏览器爬取、CSV导出、Parquet导出等场景才需要的重型依赖
+_HEAVY_MODULES = ('selenium', 'webdriver_manager', 'pandas', 'bs4', 'fake_useragent', 'pyarrow', 'requests')
+
+_IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def bench_imports(modules=('utils', 'parser_util', 'crawlers', 'main'), repeat=3):
+    """每次在新的Python进程中导入模块（冷启动），返回导入耗时中位数与被加载的重型依赖"""
+    results = []
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        samples, heavy = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, '-c', _IMPORT_PROBE.format(module=module, heavy=_HEAVY_MODULES)],
+                cwd=here, capture_output=True, text=True, check=True).stdout
+            process_seconds = time.perf_counter() - start
+            probe = json.loads(output.strip().splitlines()[-1])
+            samples.append((probe['seconds'], process_seconds))
+            heavy = probe['heavy']
+        results.append({
+            'module': module,
+            'import_seconds': statistics.median(sample[0] for sample in samples),
+            'process_seconds': statistics.median(sample[1] for sample in samples),
+            'heavy_modules': heavy,
+        })
+    return results
+
+
+def _legacy_parse_news(html_text):
+    """改写前的资讯解析（逐条正则扫描），仅用于对比"""
+    news_list = []
+    for item in re.findall(r'<li>(.*?)</li>', html_text, re.DOTALL):
+        title_match = re.search(r'>([^<]+)</a>', item)
+        time_match = re.search(r'(\d{4}-\d{2}-\d{2})', item)
+        if title_match and time_match:
+            news_list.append({'news_title': title_match.group(1), 'news_date': time_match.group(1)})
+    return news_list
+
+
+def _legacy_extract_pdf_url(html_text):
+    """改写前的PDF链接提取，仅用于对比"""
+    pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+\.pdf'
+    return re.findall(pattern, html_text)
+
+
+def bench_parsers(fixtures, stocks, repeat=50, large_items=1000):
+    """
+    解析器基准：对内存中的页面重复解析，返回每个解析器的 pages/s 与 items/s
+    资讯和研报另用large_items条的大结果页对比改写前后的解析耗时
+    """
+    stock_code, stock_name = stocks[0]
+    post_html = fixtures.post_list(stock_code, 1)
+    news_html = fixtures.news_page(stock_name, 1)
+    report_html = fixtures.report_page(stock_name, 1)
+    large_news_html = Fixtures(stocks, news_per_page=large_items).news_page(stock_name, 1)
+    report_items = re.findall(r'<li>.*?</li>', report_html) or ['<li></li>']
+    large_report_html = '<html><body><ul class="yb_list">{}</ul></body></html>'.format(
+        ''.join(report_items[i % len(report_items)] for i in range(large_items)))
+    cases = [
+        ('PostParser.parse_post_list', post_html, PostParser.parse_post_list),
+        ('PostParser.parse_post_json', post_html, lambda text: PostParser.parse_post_json(text, stock_code)),
+        ('CommentParser.parse_comment_list', fixtures.comment_page(stock_code, fixtures._post_id(1, 2)),
+         CommentParser.parse_comment_list),
+        ('NewsParser.parse_news_from_html', news_html, NewsParser.parse_news_from_html),
+        ('ReportParser.extract_pdf_url', report_html, ReportParser.extract_pdf_url),
+        (f'NewsParser (大页{large_items}条)', large_news_html, NewsParser.parse_news_from_html),
+        (f'旧版资讯正则 (大页{large_items}条)', large_news_html, _legacy_parse_news),
+        (f'extract_pdf_url (大页{large_items}条)', large_report_html, ReportParser.extract_pdf_url),
+        (f'旧版PDF正则 (大页{large_items}条)', large_report_html, _legacy_extract_pdf_url),
+    ]
+    results = []
+    for name, page_html, parse in cases:
+        items = len(parse(page_html))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            parse(page_html)
+        elapsed = time.perf_counter() - start
+        results.append({
+            'parser': name,
+            'page_kb': len(page_html.encode('utf-8')) / 1024,
+            'items': items,
+            'ms_per_page': elapsed / repeat * 1000,
+            'pages_per_sec': repeat / elapsed if elapsed else 0.0,
+            'items_per_sec': items * repeat / elapsed if elapsed else 0.0,
+        })
+    return results
+
+
+def print_results(stage_results, parser_results, server, rss, import_results=()):
+    print(f"\n[Bench] 爬虫阶段")
+    print(f"{'阶段':<20}{'用时(s)':>10}{'写入(s)':>10}{'页数':>8}{'pages/s':>10}{'文档数':>8}{'docs/s':>10}")
+    for row in stage_results:
+        print(f"{row['stage']:<20}{row['seconds']:>10.2f}{row['write_seconds']:>10.2f}{row['pages']:>8}"
+              f"{row['pages_per_sec']:>10.1f}{row['docs']:>8}{row['docs_per_sec']:>10.1f}")
+    print(f"\n[Bench] 解析器")
+    print(f"{'解析器':<36}{'页面KB':>8}{'条数':>6}{'ms/page':>10}{'pages/s':>10}{'items/s':>12}")
+    for row in parser_results:
+        print(f"{row['parser']:<36}{row['page_kb']:>8.1f}{row['items']:>6}{row['ms_per_page']:>10.2f}"
+              f"{row['pages_per_sec']:>10.1f}{row['items_per_sec']:>12.0f}")
+    if import_results:
+        print(f"\n[Bench] 冷启动导入")
+        print(f"{'模块':<16}{'导入(s)':>10}{'进程(s)':>10}  已加载的重型依赖")
+        for row in import_results:
+            print(f"{row['module']:<16}{row['import_seconds']:>10.3f}{row['process_seconds']:>10.3f}  "
+                  f"{', '.join(row['heavy_modules']) or '-'}")
+    print(f"\n[Bench] 服务器请求数: {server.counts}")
+    print(f"[Bench] 峰值内存: {rss:.1f} MB" if rss is not None else "[Bench] 峰值内存: 无法获取")
+    metrics.get_registry().print_summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线爬虫/解析器基准测试")
+    parser.add_argument('--stocks', type=int, default=len(STOCK_LIST), help="股票数量")
+    parser.add_argument('--pages', type=int, default=3, help="每只股票每个数据源的页数")
+    parser.add_argument('--rows', type=int, default=80, help="每页发帖数")
+    parser.add_argument('--repeat', type=int, default=50, help="解析器基准的重复次数")
+    parser.add_argument('--selenium', action='store_true', help="同时运行基于浏览器的爬虫（需要本机Chrome）")
+    parser.add_argument('--json', help="把结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    stocks = bench_stocks(args.stocks)
+    fixtures = Fixtures(stocks, rows_per_page=args.rows)
+    server = FixtureServer(fixtures).start()
+    pdf_dir = tempfile.mkdtemp(prefix='bench_pdf_')
+    print(f"[Bench] 本地服务器: {server.base_url}，股票: {[name for _, name in stocks]}，页数: {args.pages}")
+
+    stage_results = []
+    try:
+        with offline_environment(server, pdf_dir):
+            run_stage(stage_results, server, 'post_http', lambda: bench_http_posts(stocks, args.pages))
+            run_stage(stage_results, server, 'comment_http', lambda: bench_http_comments(stocks))
+            run_stage(stage_results, server, 'news', lambda: bench_news(stocks, args.pages))
+            run_stage(stage_results, server, 'report_download', lambda: bench_report_downloads(stocks, args.pages))
+            if args.selenium:
+                run_stage(stage_results, server, 'selenium', lambda: bench_selenium(stocks, args.pages))
+            parser_results = bench_parsers(fixtures, stocks, repeat=args.repeat)
+            rss = peak_rss_mb()
+            import_results = bench_imports()
+            print_results(stage_results, parser_results, server, rss, import_results)
+            summary = {
+                'stocks': stocks,
+                'pages': args.pages,
+                'stages': stage_results,
+                'parsers': parser_results,
+                'imports': import_results,
+                'requests': server.counts,
+                'peak_rss_mb': rss,
+                'metrics': metrics.get_registry().to_dict(),
+            }
+    finally:
+        server.stop()
+        shutil.rmtree(pdf_dir, ignore_errors=True)
+
+    if args.json:
+        directory = os.path.dirname(args.json)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"[Bench] 结果已写入: {args.json}")
+    return summary
+
+
+if __name__ == '__main__':
+    main()
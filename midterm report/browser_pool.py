@@ -0,0 +1,136 @@
+"""
+WebDriver浏览器池
+常驻若干个已启动的Chrome实例，爬虫借出/归还，避免每只股票重复启动浏览器
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from config import BROWSER_POOL_SIZE, BROWSER_MAX_PAGES, BROWSER_HEADLESS
+from utils import get_chrome_browser, close_browser
+
+
+class BrowserPool:
+    """有界浏览器池：借出前做健康检查，累计加载页数达到上限后回收重建"""
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES, headless=BROWSER_HEADLESS):
+        self.size = size
+        self.max_pages = max_pages
+        self.headless = headless
+        self._idle = []  # 空闲浏览器（后进先出，优先复用最近使用的实例）
+        self._pages = {}  # id(browser) -> 已加载页数
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def checkout(self, timeout=None):
+        """借出一个可用浏览器；池已满时阻塞等待，超时抛出TimeoutError"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._created >= self.size:
+                    if self._closed:
+                        raise RuntimeError("浏览器池已关闭")
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("等待浏览器池超时")
+                    self._cond.wait(remaining)
+                if self._closed:
+                    raise RuntimeError("浏览器池已关闭")
+                browser = self._idle.pop() if self._idle else None
+                if browser is None:
+                    self._created += 1
+
+            if browser is None:
+                return self._create()
+            if self._is_healthy(browser):
+                return browser
+            print("[BrowserPool] 浏览器无响应，重建实例")
+            self._discard(browser)
+
+    def checkin(self, browser):
+        """归还浏览器；超过页数上限或异常的实例直接销毁"""
+        if browser is None:
+            return
+        if self._closed or self._pages.get(id(browser), 0) >= self.max_pages or not self._is_healthy(browser):
+            self._discard(browser)
+            return
+        with self._cond:
+            self._idle.append(browser)
+            self._cond.notify()
+
+    def record_page(self, browser, count=1):
+        """记录浏览器加载的页数，用于定期回收"""
+        key = id(browser)
+        if key in self._pages:
+            self._pages[key] += count
+
+    @contextmanager
+    def borrow(self, timeout=None):
+        """with语句借用浏览器，结束后自动归还"""
+        browser = self.checkout(timeout=timeout)
+        try:
+            yield browser
+        finally:
+            self.checkin(browser)
+
+    def close(self):
+        """关闭池中所有空闲浏览器，借出中的实例归还时销毁"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for browser in idle:
+            self._discard(browser)
+        print("[BrowserPool] 浏览器池已关闭")
+
+    def _create(self):
+        try:
+            browser = get_chrome_browser(headless=self.headless)
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+        self._pages[id(browser)] = 0
+        print(f"[BrowserPool] 新建浏览器 ({self._created}/{self.size})")
+        return browser
+
+    def _discard(self, browser):
+        close_browser(browser)
+        with self._cond:
+            self._pages.pop(id(browser), None)
+            self._created -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _is_healthy(browser):
+        """通过一次轻量的WebDriver调用确认浏览器仍可用"""
+        try:
+            browser.current_url
+            return True
+        except Exception:
+            return False
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """获取进程内共享的浏览器池"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool._closed:
+            _default_pool = BrowserPool()
+        return _default_pool
+
+
+def close_browser_pool():
+    """关闭共享浏览器池"""
+    global _default_pool
+    with _default_pool_lock:
+        pool, _default_pool = _default_pool, None
+    if pool is not None:
+        pool.close()
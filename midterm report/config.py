@@ -8,15 +8,69 @@ STOCK_LIST = [
 
 # 爬取参数
 CRAWL_PAGES = 2  # 每个股票爬取的页数（发帖和评论）
+INCREMENTAL_CRAWL = True  # 增量爬取：记录每只股票的高水位线，翻到已入库内容即停止
 USE_MULTITHREAD = False  # 是否启用多线程
 MAX_THREADS = 5  # 最大线程数（避免请求过于密集）
 SELENIUM_TIMEOUT = 10  # 页面加载超时时间（秒）
+BROWSER_POOL_SIZE = 3  # 浏览器池最大实例数（限制并发浏览器内存占用）
+BROWSER_MAX_PAGES = 50  # 单个浏览器加载页数达到该值后回收重建
+BROWSER_HEADLESS = False  # 浏览器池是否使用无头模式
+SCHEDULER_DOMAIN_LIMITS = {  # 调度器按域名限制同时运行的任务数（"browser"为浏览器池的虚拟域名）
+    "guba.eastmoney.com": 4,
+    "so.eastmoney.com": 2,
+    "browser": BROWSER_POOL_SIZE,
+}
+COMMENT_BACKEND = "http"  # 评论爬取后端："http"（并发请求评论分页）或 "selenium"（逐帖浏览器加载）
+COMMENT_PAGE_SIZE = 30  # 评论每页条数（不足一页即为最后一页）
+COMMENT_MAX_PAGES = 20  # 单个帖子最多爬取的评论页数
+COMMENT_CONCURRENCY = 16  # HTTP后端同时爬取评论的帖子数（请求速率仍由限速器控制）
+COMMENT_SELENIUM_MAX_POSTS = 5  # selenium后端每次最多爬取评论的帖子数（逐帖加载页面较慢）
+POST_BACKEND = "selenium"  # 发帖列表爬取后端："selenium"（浏览器渲染）或 "http"（直接解析页面内嵌数据）
+PARSE_MODE = "page_source"  # 页面解析方式："page_source"（整页lxml解析）或 "element"（逐元素Selenium解析）
+HTTP_MAX_CONNECTIONS = 50  # 异步抓取连接池总连接数
+HTTP_MAX_PER_HOST = 4  # 单个主机最大在途请求数
+HTTP_TIMEOUT = 30  # 异步请求超时时间（秒）
+RATE_LIMIT_INITIAL = 1.0  # 每个主机的初始请求速率（次/秒），之后根据响应自适应调整
+RATE_LIMIT_MIN = 0.1  # 速率下限（次/秒）
+RATE_LIMIT_MAX = 10.0  # 速率上限（次/秒）
+RATE_LIMIT_BURST = 2  # 令牌桶容量（允许的突发请求数）
+RATE_LIMIT_INCREASE = 0.1  # 每次正常响应后速率的加性增量
+RATE_LIMIT_TARGET_LATENCY = 2.0  # 响应时间超过该值（秒）时视为站点吃力，小幅降速
+RATE_LIMIT_PENALTY = 30  # 遇到限流/验证页后暂停该主机的基础时长（秒），连续触发时翻倍
+RATE_LIMIT_CAPTCHA_MARKERS = ("安全验证", "验证码", "访问过于频繁")  # 页面<title>出现这些文字视为被反爬拦截
+RATE_LIMIT_CAPTCHA_MAX_BODY = 4096  # 没有<title>的页面不超过该长度（字符）时才在全文中查找验证页标记
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # 流式下载分块大小（字节）
 REPORT_KEYWORD_TEMPLATE = "http://so.eastmoney.com/Yanbao/s?keyword={stock_name}&pageindex={page}"  # 研报搜索URL模板
 
 # 存储路径配置
 DATA_DIR = "data"  # 数据根目录
 REPORT_PDF_DIR = f"{DATA_DIR}/研报PDF"  # 研报PDF保存目录
 COMMENT_RECORD_CSV = f"{DATA_DIR}/评论爬取记录.csv"
+METRICS_DIR = f"{DATA_DIR}/metrics"  # 运行指标导出目录（JSON与Prometheus文本格式）
+EXPORT_DIR = f"{DATA_DIR}/parquet"  # Parquet数据集导出目录（按 stock=/date= 分区）
+EXPORT_BATCH_SIZE = 50000  # 每个导出批次的文档数（每批在各分区写一个文件）
+UA_CACHE_FILE = f"{DATA_DIR}/user_agents.json"  # User-Agent本地缓存（utils.refresh_user_agent_cache重新生成）
+UA_BROWSERS = ("chrome", "firefox", "safari", "edge")  # 请求头池使用的浏览器类型
+
+# 查询服务配置（小程序读取接口）
+API_HOST = "0.0.0.0"
+API_PORT = 5000
+API_CACHE_TTL = 60  # 响应缓存时间（秒），数据版本变化时提前失效
+API_CACHE_SIZE = 1024  # 响应缓存条数上限（LRU淘汰）
+API_VERSION_POLL = 1.0  # 读取各股票数据版本号的最小间隔（秒）
+API_PAGE_SIZE = 20  # 列表接口默认每页条数
+API_MAX_PAGE_SIZE = 100  # 列表接口每页条数上限
+
+# MongoDB连接池配置（进程内按host:port共享一个客户端）
+MONGO_MAX_POOL_SIZE = 50  # 最大连接数
+MONGO_MIN_POOL_SIZE = 0  # 最小保持连接数
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000  # 选择服务器超时（毫秒）
+MONGO_CONNECT_TIMEOUT_MS = 5000  # 建立连接超时（毫秒）
+MONGO_SOCKET_TIMEOUT_MS = 30000  # 读写超时（毫秒）
+
+# MongoDB批量写入配置
+MONGO_BATCH_SIZE = 200  # 缓冲文档数达到该值时批量写入
+MONGO_FLUSH_INTERVAL = 5  # 距上次写入超过该秒数时批量写入
 
 # 反爬配置（代理池可选，需替换为有效代理）
 PROXIES_POOL = [
@@ -26,6 +80,43 @@ PROXIES_POOL = [
 # 目标网站URL模板
 URL_TEMPLATES = {
     "bar": "https://guba.eastmoney.com/list,{stock_code}.html",  # 股吧
+    "bar_page": "https://guba.eastmoney.com/list,{stock_code}_{page}.html",  # 股吧分页（HTTP后端）
+    "post": "https://guba.eastmoney.com/news,{stock_code},{post_id}.html",  # 股吧帖子详情
+    "post_page": "https://guba.eastmoney.com/news,{stock_code},{post_id}_{page}.html",  # 帖子评论分页（第2页起）
     "report": "http://so.eastmoney.com/Yanbao/s?keyword={stock_name}",  # 研报
     "news": "http://so.eastmoney.com/News/s?keyword={stock_name}"  # 资讯检索
 }
+
+# 情感分析配置
+SKEP_MODEL_DIR = "model/ernie_skep_sentiment_analysis"  # SKEP模型目录
+SENTIMENT_BATCH_SIZE = 64  # 每批送入模型的文本数
+SENTIMENT_USE_GPU = False  # 是否使用GPU推理
+SENTIMENT_HIST_BINS = 10  # 情感汇总桶中正面概率直方图的分箱数
+
+# 分词配置
+TOKENIZE_WORKERS = 4  # 分词进程数（1为单进程）
+TOKENIZE_CHUNK_SIZE = 500  # 每个进程任务处理的文本数
+
+# 近重复检测配置
+DEDUP_ENABLED = True  # 入库前按标题SimHash检测近重复
+DEDUP_MODE = "link"  # "link"：照常保存并用dup_of指向首条；"drop"：不保存近重复
+DEDUP_MAX_DISTANCE = 4  # 64位SimHash的汉明距离阈值
+DEDUP_SHINGLE = 2  # 字符n-gram长度
+DEDUP_MIN_LENGTH = 8  # 清洗后短于该长度的标题只做完全相同去重
+
+# 研报文本抽取配置
+REPORT_EXTRACT_WORKERS = 4  # 解析PDF的进程数（1为单进程）
+REPORT_EXTRACT_MAX_PAGES = 50  # 每份研报最多抽取的页数
+REPORT_RATING_PAGES = 2  # 在前几页中查找评级和目标价
+
+# 增量主题聚类配置
+TOPIC_CLUSTERS = 5  # 主题数
+TOPIC_MODEL_DIR = f"{DATA_DIR}/models"  # 主题模型状态保存目录
+TOPIC_SAMPLE_SIZE = 5000  # 用于重新定心的近期样本上限（控制内存）
+TOPIC_RECENTER_EVERY = 20  # 每增量更新多少次后重新定心
+
+# 关键词词频配置
+KEYWORD_CACHE_TTL = 300  # 窗口Top-K结果的进程内缓存时间（秒）
+KEYWORD_SKETCH_CAPACITY = 1000  # 近似Top-K（Space-Saving）保留的计数器个数
+WORDCLOUD_DIR = f"{DATA_DIR}/wordcloud"  # 词云图片缓存目录
+WORDCLOUD_FONT_PATH = "C:\\Windows\\Fonts\\msyh.ttc"  # 词云中文字体
@@ -0,0 +1,64 @@
+"""
+增量爬取状态
+按(股票, 数据源)在MongoDB中记录已入库内容的高水位线（最新帖子ID / 最新日期）
+"""
+
+from mongodb import MongoAPI
+
+
+def _id_greater(a, b):
+    """比较两个帖子ID，纯数字时按数值比较"""
+    if str(a).isdigit() and str(b).isdigit():
+        return int(a) > int(b)
+    return str(a) > str(b)
+
+
+class CrawlState(object):
+    """单只股票单个数据源的高水位线"""
+
+    def __init__(self, stock_code, source):
+        self.stock_code = stock_code
+        self.source = source
+        self.mongo = MongoAPI('stock_sentiment', 'crawl_state')
+        self.key = f'{source}_{stock_code}'
+        doc = self.mongo.find_one({'_id': self.key}, None) or {}
+        self.last_id = doc.get('last_id')
+        self.last_date = doc.get('last_date')
+        self._max_id = self.last_id
+        self._max_date = self.last_date
+
+    @property
+    def has_history(self):
+        return self.last_id is not None or self.last_date is not None
+
+    def is_new(self, item_id=None, item_date=None):
+        """判断条目是否在上次高水位线之后（与高水位线同一天的条目由调用方按已入库的_id判断，见is_last_day）"""
+        if item_id is not None and self.last_id is not None:
+            return _id_greater(item_id, self.last_id)
+        if item_date and self.last_date:
+            return item_date > self.last_date
+        return True
+
+    def is_last_day(self, item_date):
+        """条目日期是否与上次高水位线同一天（同一天可能有上次之后发布的条目）"""
+        return bool(item_date) and item_date == self.last_date
+
+    def advance(self, item_id=None, item_date=None):
+        """用本次爬到的条目推进高水位线（调用save后生效）"""
+        if item_id is not None and (self._max_id is None or _id_greater(item_id, self._max_id)):
+            self._max_id = item_id
+        if item_date and (self._max_date is None or item_date > self._max_date):
+            self._max_date = item_date
+
+    def save(self):
+        """持久化高水位线（应在数据写入完成之后调用）"""
+        if self._max_id == self.last_id and self._max_date == self.last_date:
+            return
+        self.mongo.collection.update_one(
+            {'_id': self.key},
+            {'$set': {'stock_code': self.stock_code, 'source': self.source,
+                      'last_id': self._max_id, 'last_date': self._max_date}},
+            upsert=True
+        )
+        self.last_id = self._max_id
+        self.last_date = self._max_date
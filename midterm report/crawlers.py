@@ -1,101 +1,307 @@
+import asyncio
 import time
 import os
-from datetime import datetime, timedelta
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import requests
-import re
-
-from utils import get_chrome_browser, request_with_retry, create_dir, get_random_header
-from config import SELENIUM_TIMEOUT, URL_TEMPLATES, REPORT_PDF_DIR
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import create_dir, get_random_header, sha256_of_file
+from config import (SELENIUM_TIMEOUT, URL_TEMPLATES, REPORT_PDF_DIR, PARSE_MODE, INCREMENTAL_CRAWL, DEDUP_ENABLED,
+                    COMMENT_PAGE_SIZE, COMMENT_MAX_PAGES, COMMENT_CONCURRENCY)
 from parser_util import PostParser, CommentParser, ReportParser, NewsParser
-from mongodb import MongoAPI
+from mongodb import MongoAPI, make_doc_id
+from async_fetcher import AsyncFetcher, run_sync
+from browser_pool import get_browser_pool
+from crawl_state import CrawlState
+from rate_limiter import get_rate_limiter
+from dedup import get_dedup_index
+import metrics
+
+# selenium在浏览器爬虫的方法内导入，只用HTTP爬虫的进程不加载
+
+# 已爬取过的发帖重新出现在列表中时更新的计数字段
+POST_COUNT_FIELDS = ('post_reply', 'post_like', 'post_click')
+
+
+def load_page(pool, browser, wait, page_url, selector, source=None, stock_code=None):
+    """
+    经限速器放行后加载页面并等待selector对应的元素出现（分别记录page_load与wait阶段耗时）
+    加载超时时检查是否为反爬验证页并上报限速器，随后抛出TimeoutException
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    limiter = get_rate_limiter()
+    limiter.acquire(page_url)
+    start = time.perf_counter()
+    with metrics.timer('crawl_stage_seconds', stage='page_load', source=source, stock=stock_code):
+        browser.get(page_url)
+    pool.record_page(browser)
+    try:
+        with metrics.timer('crawl_stage_seconds', stage='wait', source=source, stock=stock_code):
+            wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector)))
+    except TimeoutException:
+        metrics.inc('crawl_page_timeouts_total', source=source, stock=stock_code)
+        if limiter.feedback(page_url, text=browser.page_source):
+            print(f"[load_page] 遇到验证页: {page_url}")
+        else:
+            limiter.feedback(page_url, error=True)
+        raise
+    limiter.feedback(page_url, latency=time.perf_counter() - start)
 
 
 class PostCrawler:
     """股吧发帖爬虫"""
     
-    def __init__(self, stock_code):
+    def __init__(self, stock_code, pool=None):
         self.stock_code = stock_code
-        self.browser = get_chrome_browser(headless=False)
-        self.wait = WebDriverWait(self.browser, SELENIUM_TIMEOUT)
+        self.pool = pool or get_browser_pool()
+        self.browser = None  # 首次加载页面时才从浏览器池借出
+        self.wait = None
         self.mongo = MongoAPI('stock_sentiment', f'post_{stock_code}')
+        self.writer = self.mongo.bulk_writer()
+        self.state = CrawlState(stock_code, 'post') if INCREMENTAL_CRAWL else None
+        self.dedup = get_dedup_index(stock_code, 'post') if DEDUP_ENABLED else None
+        self.start_date = None
+        self.end_date = None
+        self.failed_pages = 0  # 加载失败的页数，有失败页时不推进高水位线
     
     def crawl_post_info(self, pages=1):
-        """爬取发帖信息，返回爬取的日期范围"""
-        url = URL_TEMPLATES['bar'].format(stock_code=self.stock_code)
-        start_date = None
-        end_date = None
+        """爬取发帖信息，返回爬取的日期范围（增量模式下遇到无新帖的页即停止翻页）"""
+        self.start_date = None
+        self.end_date = None
+        self.failed_pages = 0
         
         try:
             for page in range(1, pages + 1):
-                page_url = f"{url}?page={page}"
-                print(f"[PostCrawler] 爬取第{page}页: {page_url}")
-                
-                try:
-                    self.browser.get(page_url)
-                    time.sleep(2)
-                    
-                    # 等待发帖列表加载
-                    self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "table tbody tr")))
-                    
-                    elements = self.browser.find_elements(By.CSS_SELECTOR, "table tbody tr")
-                    print(f"[PostCrawler] 找到 {len(elements)} 条发帖")
-                    
-                    for element in elements:
-                        try:
-                            post_info = PostParser.parse_post(element)
-                            if post_info:
-                                # 记录日期范围
-                                if start_date is None:
-                                    start_date = post_info['post_date']
-                                end_date = post_info['post_date']
-                                
-                                self.mongo.insert_one(post_info)
-                                print(f"  [保存] {post_info['post_title'][:30]} - {post_info['post_date']}")
-                        except Exception as e:
-                            print(f"  [错误] 解析单条发帖失败: {str(e)}")
-                            continue
-                    
-                except TimeoutException:
-                    print(f"[PostCrawler] 第{page}页加载超时，跳过")
+                new_count = self.crawl_page(page)
+                if new_count is None:
                     continue
-                
-                time.sleep(1)
+                if self.state is not None and new_count == 0:
+                    print(f"[PostCrawler] 第{page}页无新发帖，停止翻页")
+                    break
             
-            return (start_date, end_date)
+            self.commit_state()
+            return (self.start_date, self.end_date)
         
         except Exception as e:
             print(f"[PostCrawler] 爬取异常: {str(e)}")
             return (None, None)
     
+    def crawl_page(self, page):
+        """爬取单页发帖，返回新发帖条数（加载超时返回None）"""
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        if self.browser is None:
+            self.browser = self.pool.checkout()
+            self.wait = WebDriverWait(self.browser, SELENIUM_TIMEOUT)
+        page_url = f"{URL_TEMPLATES['bar'].format(stock_code=self.stock_code)}?page={page}"
+        print(f"[PostCrawler] 爬取第{page}页: {page_url}")
+        
+        try:
+            # 等待发帖列表加载
+            load_page(self.pool, self.browser, self.wait, page_url, "table tbody tr", 'post', self.stock_code)
+            
+            with metrics.timer('crawl_stage_seconds', stage='parse', source='post', stock=self.stock_code):
+                posts = self._parse_posts()
+            return self._save_posts(posts)
+        except TimeoutException:
+            print(f"[PostCrawler] 第{page}页加载超时，跳过")
+            self.failed_pages += 1
+            return None
+    
+    def release_browser(self):
+        """提前归还浏览器（分页任务之间不占用浏览器，下一页时重新借出）"""
+        if self.browser is not None:
+            self.pool.checkin(self.browser)
+            self.browser = None
+    
+    def _save_posts(self, posts):
+        """保存一页发帖并记录日期范围，返回新发帖条数（含近重复，用于判断是否继续翻页）"""
+        new_count = 0
+        saved = 0
+        for post_info in posts:
+            try:
+                if post_info:
+                    if self.state is not None:
+                        if not self.state.is_new(post_info.get('post_id')):
+                            self._refresh_counts(post_info)
+                            continue
+                        self.state.advance(post_info.get('post_id'))
+                    new_count += 1
+                    
+                    # 记录日期范围
+                    if self.start_date is None:
+                        self.start_date = post_info['post_date']
+                    self.end_date = post_info['post_date']
+                    
+                    post_info['_id'] = post_info.get('post_id') or make_doc_id(
+                        self.stock_code, post_info['post_title'], post_info['post_date'], post_info['post_time'])
+                    if not self._check_duplicate(post_info):
+                        continue
+                    self.writer.upsert(post_info)
+                    saved += 1
+                    print(f"  [保存] {post_info['post_title'][:30]} - {post_info['post_date']}")
+            except Exception as e:
+                print(f"  [错误] 保存单条发帖失败: {str(e)}")
+                continue
+        metrics.inc('crawl_items_total', saved, source='post', stock=self.stock_code)
+        return new_count
+    
+    def _refresh_counts(self, post_info):
+        """
+        已爬取过的发帖只更新评论数、点赞数、阅读数（评论爬虫据此判断是否有新评论）
+        计数有变化时清除exported，下次增量导出写入新行
+        """
+        post_id = post_info.get('post_id')
+        counts = {key: post_info[key] for key in POST_COUNT_FIELDS if key in post_info}
+        if post_id and counts:
+            changed = [{key: {'$ne': value}} for key, value in counts.items()]
+            self.writer.update({'_id': post_id, '$or': changed}, {'$set': counts, '$unset': {'exported': ''}})
+    
+    def _check_duplicate(self, post_info):
+        """标记近重复发帖，返回False表示不保存"""
+        if self.dedup is None:
+            return True
+        keep = self.dedup.mark(post_info)
+        if 'dup_of' in post_info:
+            metrics.inc('crawl_duplicates_total', source='post', stock=self.stock_code)
+            print(f"  [近重复] {post_info['post_title'][:30]} -> {post_info['dup_of']}")
+        return keep
+    
+    def commit_state(self):
+        """写入缓冲数据后持久化高水位线（有失败页时只写入数据，下次运行仍从原高水位线补爬）"""
+        if self.state is not None:
+            self.writer.flush()
+            if self.failed_pages:
+                print(f"[PostCrawler] {self.failed_pages}页爬取失败，不更新高水位线")
+                return
+            self.state.save()
+    
+    def _parse_posts(self):
+        """解析当前页面的发帖列表"""
+        if PARSE_MODE == "page_source":
+            posts = PostParser.parse_post_list(self.browser.page_source)
+            print(f"[PostCrawler] 找到 {len(posts)} 条发帖")
+            return posts
+        from selenium.webdriver.common.by import By
+        elements = self.browser.find_elements(By.CSS_SELECTOR, "table tbody tr")
+        print(f"[PostCrawler] 找到 {len(elements)} 条发帖")
+        posts = []
+        for element in elements:
+            try:
+                posts.append(PostParser.parse_post(element))
+            except Exception as e:
+                print(f"  [错误] 解析单条发帖失败: {str(e)}")
+        return posts
+    
     def cleanup(self):
         """清理资源"""
         try:
-            self.browser.quit()
-            print("[PostCrawler] 浏览器已关闭")
+            self.writer.close()
         except Exception as e:
-            print(f"[PostCrawler] 关闭浏览器失败: {str(e)}")
+            print(f"[PostCrawler] 写入缓冲数据失败: {str(e)}")
+        try:
+            self.release_browser()
+            print("[PostCrawler] 浏览器已归还")
+        except Exception as e:
+            print(f"[PostCrawler] 归还浏览器失败: {str(e)}")
+
+
+class HttpPostCrawler(PostCrawler):
+    """股吧发帖爬虫（HTTP后端）：直接请求列表页，解析页面内嵌的article_list数据，无需浏览器"""
+    
+    def __init__(self, stock_code):
+        self.stock_code = stock_code
+        self.mongo = MongoAPI('stock_sentiment', f'post_{stock_code}')
+        self.writer = self.mongo.bulk_writer()
+        self.state = CrawlState(stock_code, 'post') if INCREMENTAL_CRAWL else None
+        self.dedup = get_dedup_index(stock_code, 'post') if DEDUP_ENABLED else None
+        self.start_date = None
+        self.end_date = None
+        self.failed_pages = 0
+    
+    def page_url(self, page):
+        return URL_TEMPLATES['bar_page'].format(stock_code=self.stock_code, page=page)
+    
+    def crawl_post_info(self, pages=1):
+        """爬取发帖信息，返回爬取的日期范围"""
+        async def _run():
+            async with AsyncFetcher() as fetcher:
+                return await self.crawl_post_info_async(fetcher, pages=pages)
+        return run_sync(_run())
+    
+    async def crawl_post_info_async(self, fetcher, pages=1):
+        """首次爬取并发请求各页，增量模式逐页请求并在无新帖时停止"""
+        page_urls = [self.page_url(page) for page in range(1, pages + 1)]
+        self.start_date = None
+        self.end_date = None
+        self.failed_pages = 0
+        
+        try:
+            if self.state is not None and self.state.has_history:
+                for page_url in page_urls:
+                    print(f"[HttpPostCrawler] 增量爬取: {page_url}")
+                    html = await fetcher.fetch_text(page_url)
+                    if self.save_page(page_url, html) == 0:
+                        print(f"[HttpPostCrawler] 无新发帖，停止翻页")
+                        break
+            else:
+                print(f"[HttpPostCrawler] 并发爬取{len(page_urls)}页")
+                html_list = await fetcher.fetch_all_text(page_urls)
+                for page_url, html in zip(page_urls, html_list):
+                    self.save_page(page_url, html)
+            
+            self.commit_state()
+            return (self.start_date, self.end_date)
+        
+        except Exception as e:
+            print(f"[HttpPostCrawler] 爬取异常: {str(e)}")
+            return (None, None)
+    
+    def save_page(self, page_url, html):
+        """解析并保存一页发帖，返回新发帖条数（请求失败返回None）"""
+        if not html:
+            print(f"[HttpPostCrawler] 请求失败: {page_url}")
+            self.failed_pages += 1
+            return None
+        with metrics.timer('crawl_stage_seconds', stage='parse', source='post', stock=self.stock_code):
+            posts = PostParser.parse_post_json(html, self.stock_code)
+        print(f"[HttpPostCrawler] 找到 {len(posts)} 条发帖")
+        return self._save_posts(posts)
+    
+    def release_browser(self):
+        """HTTP后端不占用浏览器"""
+    
+    def cleanup(self):
+        """清理资源"""
+        try:
+            self.writer.close()
+        except Exception as e:
+            print(f"[HttpPostCrawler] 写入缓冲数据失败: {str(e)}")
 
 
 class CommentCrawler:
     """股吧评论爬虫"""
     
-    def __init__(self, stock_code):
+    def __init__(self, stock_code, pool=None):
+        from selenium.webdriver.support.ui import WebDriverWait
+
         self.stock_code = stock_code
-        self.browser = get_chrome_browser(headless=False)
+        self.pool = pool or get_browser_pool()
+        self.browser = self.pool.checkout()
         self.wait = WebDriverWait(self.browser, SELENIUM_TIMEOUT)
         self.post_mongo = MongoAPI('stock_sentiment', f'post_{stock_code}')
         self.comment_mongo = MongoAPI('stock_sentiment', f'comment_{stock_code}')
+        self.comment_writer = self.comment_mongo.bulk_writer()
     
     def find_by_date(self, start_date, end_date):
         """根据日期范围查询发帖"""
         try:
             posts = list(self.post_mongo.find(
                 {'post_date': {'$gte': start_date, '$lte': end_date}},
-                {'_id': 1, 'post_title': 1, 'post_date': 1}
+                {'_id': 1, 'post_id': 1, 'post_title': 1, 'post_date': 1, 'post_reply': 1, 'comment_reply': 1}
             ))
             print(f"[CommentCrawler] 找到 {len(posts)} 条在{start_date}-{end_date}范围内的发帖")
             return posts
@@ -105,132 +311,377 @@ class CommentCrawler:
     
     def crawl_comment_info(self, post_url, post_id):
         """爬取单个帖子的评论"""
+        from selenium.common.exceptions import TimeoutException
+
         try:
-            self.browser.get(post_url)
-            time.sleep(1)
-            
             # 等待评论区加载
-            self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".article-item")))
-            
-            comments = self.browser.find_elements(By.CSS_SELECTOR, ".article-item")
-            print(f"[CommentCrawler] 找到 {len(comments)} 条评论")
+            load_page(self.pool, self.browser, self.wait, post_url, ".article-item", 'comment', self.stock_code)
             
-            for comment_element in comments:
-                try:
-                    comment_info = CommentParser.parse_comment(comment_element)
-                    if comment_info:
-                        comment_info['post_id'] = post_id
-                        self.comment_mongo.insert_one(comment_info)
-                except Exception as e:
-                    print(f"  [错误] 解析评论失败: {str(e)}")
-                    continue
+            with metrics.timer('crawl_stage_seconds', stage='parse', source='comment', stock=self.stock_code):
+                comments = self._parse_comments()
+            self._save_comments(comments, post_id)
         
         except TimeoutException:
             print(f"[CommentCrawler] 评论加载超时")
         except Exception as e:
             print(f"[CommentCrawler] 爬取评论异常: {str(e)}")
     
+    def _save_comments(self, comments, post_id):
+        """批量写入一页评论，返回保存条数"""
+        saved = 0
+        for comment_info in comments:
+            try:
+                if comment_info:
+                    comment_info['post_id'] = post_id
+                    comment_info['_id'] = make_doc_id(
+                        post_id, comment_info['comment_author'], comment_info['comment_time'], comment_info['comment_content'])
+                    self.comment_writer.upsert(comment_info)
+                    saved += 1
+            except Exception as e:
+                print(f"  [错误] 保存评论失败: {str(e)}")
+                continue
+        metrics.inc('crawl_items_total', saved, source='comment', stock=self.stock_code)
+        return saved
+    
+    def _parse_comments(self):
+        """解析当前页面的评论列表"""
+        if PARSE_MODE == "page_source":
+            comments = CommentParser.parse_comment_list(self.browser.page_source)
+            print(f"[CommentCrawler] 找到 {len(comments)} 条评论")
+            return comments
+        from selenium.webdriver.common.by import By
+        elements = self.browser.find_elements(By.CSS_SELECTOR, ".article-item")
+        print(f"[CommentCrawler] 找到 {len(elements)} 条评论")
+        comments = []
+        for element in elements:
+            try:
+                comments.append(CommentParser.parse_comment(element))
+            except Exception as e:
+                print(f"  [错误] 解析评论失败: {str(e)}")
+        return comments
+    
     def cleanup(self):
         """清理资源"""
         try:
-            self.browser.quit()
-            print("[CommentCrawler] 浏览器已关闭")
+            self.comment_writer.close()
+        except Exception as e:
+            print(f"[CommentCrawler] 写入缓冲数据失败: {str(e)}")
+        try:
+            self.pool.checkin(self.browser)
+            self.browser = None
+            print("[CommentCrawler] 浏览器已归还")
+        except Exception as e:
+            print(f"[CommentCrawler] 归还浏览器失败: {str(e)}")
+
+
+def _reply_count(post):
+    """发帖列表中的评论数，未知时返回None"""
+    try:
+        return int(post.get('post_reply'))
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpCommentCrawler(CommentCrawler):
+    """
+    股吧评论爬虫（HTTP后端）：多个帖子的评论页共享连接池并发请求，
+    每个帖子按评论数翻页（不足一页即停止），评论批量写入
+    写入在单独的写入线程中执行，BulkWriter达到批量时的flush不阻塞事件循环
+    帖子记录已爬取时的评论数（comment_reply），评论数未变化的帖子再次运行时跳过
+    """
+    
+    def __init__(self, stock_code, concurrency=COMMENT_CONCURRENCY, max_pages=COMMENT_MAX_PAGES):
+        self.stock_code = stock_code
+        self.concurrency = concurrency
+        self.max_pages = max_pages
+        self.post_mongo = MongoAPI('stock_sentiment', f'post_{stock_code}')
+        self.post_writer = self.post_mongo.bulk_writer()
+        self.comment_mongo = MongoAPI('stock_sentiment', f'comment_{stock_code}')
+        self.comment_writer = self.comment_mongo.bulk_writer()
+        self._write_executor = ThreadPoolExecutor(max_workers=1)
+    
+    async def _write(self, fn, *args):
+        """在写入线程中执行写入操作（单线程，保持写入顺序）"""
+        return await asyncio.get_running_loop().run_in_executor(self._write_executor, fn, *args)
+    
+    def page_url(self, post_id, page):
+        if page == 1:
+            return URL_TEMPLATES['post'].format(stock_code=self.stock_code, post_id=post_id)
+        return URL_TEMPLATES['post_page'].format(stock_code=self.stock_code, post_id=post_id, page=page)
+    
+    @staticmethod
+    def pending_posts(posts):
+        """过滤出需要爬取评论的帖子：有帖子ID、评论数不为0且与上次爬取时不同"""
+        pending = []
+        for post in posts:
+            post_id = str(post.get('post_id') or post['_id'])
+            reply = _reply_count(post)
+            if not post_id.isdigit() or reply == 0:
+                continue
+            if reply is not None and post.get('comment_reply') == reply:
+                continue
+            pending.append(post)
+        return pending
+    
+    def crawl_comments(self, posts):
+        """爬取多个帖子的评论，返回保存的评论条数"""
+        async def _run():
+            async with AsyncFetcher() as fetcher:
+                return await self.crawl_comments_async(fetcher, posts)
+        return run_sync(_run())
+    
+    async def crawl_comments_async(self, fetcher, posts):
+        """使用共享抓取器并发爬取多个帖子的评论（同时进行的帖子数不超过concurrency）"""
+        pending = self.pending_posts(posts)
+        print(f"[HttpCommentCrawler] {len(posts)}条发帖中{len(pending)}条需要爬取评论")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def _crawl(post):
+            async with semaphore:
+                return await self.crawl_post_comments_async(fetcher, post)
+        
+        counts = await asyncio.gather(*(_crawl(post) for post in pending))
+        await self._write(self.comment_writer.flush)
+        await self._write(self.post_writer.flush)
+        return sum(counts)
+    
+    async def crawl_post_comments_async(self, fetcher, post):
+        """逐页爬取单个帖子的评论，返回保存条数"""
+        post_id = str(post.get('post_id') or post['_id'])
+        reply = _reply_count(post)
+        last_page = self.max_pages
+        if reply is not None:
+            last_page = min(self.max_pages, max(1, -(-reply // COMMENT_PAGE_SIZE)))
+        
+        saved = 0
+        try:
+            for page in range(1, last_page + 1):
+                page_url = self.page_url(post_id, page)
+                html = await fetcher.fetch_text(page_url)
+                if not html:
+                    print(f"[HttpCommentCrawler] 请求失败: {page_url}")
+                    return saved
+                with metrics.timer('crawl_stage_seconds', stage='parse', source='comment', stock=self.stock_code):
+                    comments = CommentParser.parse_comment_list(html)
+                saved += await self._write(self._save_comments, comments, post_id)
+                if len(comments) < COMMENT_PAGE_SIZE:
+                    break
         except Exception as e:
-            print(f"[CommentCrawler] 关闭浏览器失败: {str(e)}")
+            print(f"[HttpCommentCrawler] 爬取评论异常 {post_id}: {str(e)}")
+            return saved
+        
+        # 全部页面成功后才记录，失败的帖子下次重试
+        if reply is not None:
+            await self._write(self.post_writer.update, {'_id': post['_id']}, {'$set': {'comment_reply': reply}})
+        print(f"  [评论] {post.get('post_title', '')[:20]} 共{page}页 {saved}条")
+        return saved
+    
+    def cleanup(self):
+        """清理资源"""
+        for writer in (self.comment_writer, self.post_writer):
+            try:
+                writer.close()
+            except Exception as e:
+                print(f"[HttpCommentCrawler] 写入缓冲数据失败: {str(e)}")
+        self._write_executor.shutdown()
 
 
 class ReportCrawler:
-    """研报下载爬虫"""
+    """研报下载爬虫（下载协程中的MongoDB读写与文件哈希在单独的写入线程中执行，不阻塞共享事件循环）"""
     
-    def __init__(self, stock_code, stock_name):
+    def __init__(self, stock_code, stock_name, pool=None):
         self.stock_code = stock_code
         self.stock_name = stock_name
-        self.browser = get_chrome_browser(headless=False)
-        self.wait = WebDriverWait(self.browser, SELENIUM_TIMEOUT)
+        self.pool = pool or get_browser_pool()
+        self.browser = None  # 首次加载页面时才从浏览器池借出
+        self.wait = None
         self.report_mongo = MongoAPI('stock_sentiment', f'report_{stock_code}')
+        self.report_writer = self.report_mongo.bulk_writer()
         self.save_dir = os.path.join(REPORT_PDF_DIR, stock_code)
+        self._paths_by_hash = {}  # sha256 -> 已保存的文件路径
+        self._write_executor = ThreadPoolExecutor(max_workers=1)
         create_dir(self.save_dir)
     
+    async def _write(self, fn, *args):
+        """在写入线程中执行同步的数据库/文件操作（单线程，保持写入顺序）"""
+        return await asyncio.get_running_loop().run_in_executor(self._write_executor, fn, *args)
+    
     def crawl_stock_reports(self, pages=1):
-        """爬取并下载研报PDF"""
-        search_url = URL_TEMPLATES['report'].format(stock_name=self.stock_name)
+        """爬取研报列表，并发下载PDF"""
+        reports = self.collect_reports(pages=pages)
+        if reports:
+            run_sync(self._download_reports(reports))
+
+    def collect_reports(self, pages=1):
+        """逐页收集研报(标题, PDF链接)，不下载"""
+        reports = []
         
         try:
             for page in range(1, pages + 1):
-                page_url = f"{search_url}&pageindex={page}"
-                print(f"[ReportCrawler] 爬取第{page}页: {page_url}")
-                
-                try:
-                    self.browser.get(page_url)
-                    time.sleep(2)
-                    
-                    # 等待研报列表加载
-                    self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".yb_list li")))
-                    
-                    elements = self.browser.find_elements(By.CSS_SELECTOR, ".yb_list li")
-                    print(f"[ReportCrawler] 找到 {len(elements)} 个研报")
-                    
-                    for element in elements:
-                        try:
-                            # 提取研报信息
-                            title = element.find_element(By.CSS_SELECTOR, ".title").text
-                            pdf_link = element.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
-                            
-                            if pdf_link and '.pdf' in pdf_link.lower():
-                                # 下载PDF
-                                self._download_pdf(pdf_link, title)
-                                
-                                # 存储到MongoDB
-                                report_info = {
-                                    'report_title': title,
-                                    'report_url': pdf_link,
-                                    'download_time': datetime.now().isoformat()
-                                }
-                                self.report_mongo.insert_one(report_info)
-                                print(f"  [保存] {title}")
-                        
-                        except Exception as e:
-                            print(f"  [错误] 下载研报失败: {str(e)}")
-                            continue
-                    
-                except TimeoutException:
-                    print(f"[ReportCrawler] 第{page}页加载超时，跳过")
+                page_reports = self.collect_report_page(page)
+                if page_reports is None:
                     continue
-                
-                time.sleep(1)
+                reports.extend(page_reports)
         
         except Exception as e:
             print(f"[ReportCrawler] 爬取异常: {str(e)}")
+        
+        return reports
+
+    def collect_report_page(self, page):
+        """收集单页研报(标题, PDF链接)列表（加载超时返回None）"""
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        if self.browser is None:
+            self.browser = self.pool.checkout()
+            self.wait = WebDriverWait(self.browser, SELENIUM_TIMEOUT)
+        search_url = URL_TEMPLATES['report'].format(stock_name=self.stock_name)
+        page_url = f"{search_url}&pageindex={page}"
+        print(f"[ReportCrawler] 爬取第{page}页: {page_url}")
+        reports = []
+        
+        try:
+            # 等待研报列表加载
+            load_page(self.pool, self.browser, self.wait, page_url, ".yb_list li", 'report', self.stock_code)
+            
+            elements = self.browser.find_elements(By.CSS_SELECTOR, ".yb_list li")
+            print(f"[ReportCrawler] 找到 {len(elements)} 个研报")
+        except TimeoutException:
+            print(f"[ReportCrawler] 第{page}页加载超时，跳过")
+            return None
+        
+        with metrics.timer('crawl_stage_seconds', stage='parse', source='report', stock=self.stock_code):
+            for element in elements:
+                try:
+                    # 提取研报信息
+                    title = element.find_element(By.CSS_SELECTOR, ".title").text
+                    pdf_link = element.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
+                    
+                    if pdf_link and '.pdf' in pdf_link.lower():
+                        reports.append((title, pdf_link))
+                
+                except Exception as e:
+                    print(f"  [错误] 解析研报失败: {str(e)}")
+                    continue
+        return reports
+
+    def release_browser(self):
+        """提前归还浏览器（下载PDF阶段不需要浏览器）"""
+        if self.browser is not None:
+            self.pool.checkin(self.browser)
+            self.browser = None
+
+    async def download_reports_async(self, fetcher, reports):
+        """使用共享抓取器并发下载研报PDF并存储记录"""
+        results = await asyncio.gather(
+            *(self._download_pdf_async(fetcher, url, title) for title, url in reports),
+            return_exceptions=True
+        )
+        for (title, pdf_link), result in zip(reports, results):
+            if isinstance(result, Exception):
+                print(f"  [错误] 下载研报失败: {str(result)}")
+                continue
+            await self._write(self.save_report, title, pdf_link, result)
+
+    def save_report(self, title, pdf_link, file_info):
+        """存储一条研报记录（file_info为下载结果，下载失败时为None）"""
+        try:
+            # 存储到MongoDB
+            report_info = {
+                '_id': make_doc_id(self.stock_code, pdf_link),
+                'report_title': title,
+                'report_url': pdf_link,
+                'download_time': datetime.now().isoformat()
+            }
+            if file_info:
+                report_info.update({
+                    'file_path': file_info['path'],
+                    'sha256': file_info['sha256'],
+                    'file_size': file_info['size'],
+                })
+            self.report_writer.upsert(report_info)
+            metrics.inc('crawl_items_total', source='report', stock=self.stock_code)
+            print(f"  [保存] {title}")
+        except Exception as e:
+            print(f"  [错误] 存储研报失败: {str(e)}")
+
+    async def _download_reports(self, reports):
+        async with AsyncFetcher() as fetcher:
+            await self.download_reports_async(fetcher, reports)
     
-    def _download_pdf(self, url, title, max_retries=3):
-        """下载PDF文件"""
+    def _download_pdf(self, url, title):
+        """下载单个PDF文件，返回文件信息（失败返回None）"""
+        async def _run():
+            async with AsyncFetcher() as fetcher:
+                return await self._download_pdf_async(fetcher, url, title)
+        return run_sync(_run())
+
+    async def _download_pdf_async(self, fetcher, url, title):
+        """流式下载PDF文件（支持断点续传），返回 {'path', 'sha256', 'size'}"""
         filename = f"{title}.pdf"
         filepath = os.path.join(self.save_dir, filename)
         
-        # 避免重复下载
+        # 避免重复下载：同一链接已下载过（文件可能因内容去重保存在其他标题名下），或同名文件已存在
+        known = await self._write(self._known_file, url)
+        if known is not None:
+            print(f"  [跳过] {filename} 已下载: {known['path']}")
+            return known
         if os.path.exists(filepath):
             print(f"  [跳过] {filename} 已存在")
-            return
+            file_info = {
+                'path': filepath,
+                'sha256': (await self._write(sha256_of_file, filepath)).hexdigest(),
+                'size': os.path.getsize(filepath),
+            }
+        else:
+            with metrics.timer('crawl_stage_seconds', stage='download', source='report', stock=self.stock_code):
+                file_info = await fetcher.download(url, filepath, magic=b"%PDF")
+            if file_info is None:
+                print(f"  [失败] {filename} 下载失败")
+                metrics.inc('download_failures_total', stock=self.stock_code)
+                return None
+            metrics.inc('download_bytes_total', file_info['size'], stock=self.stock_code)
+            print(f"  [下载] {filename} -> {filepath}")
+        return await self._write(self._dedup_file, file_info)
+
+    def _known_file(self, url):
+        """该链接的研报记录中已保存且仍存在的文件信息，没有时返回None"""
+        doc = self.report_mongo.find_one({'_id': make_doc_id(self.stock_code, url)},
+                                         {'file_path': 1, 'sha256': 1, 'file_size': 1})
+        if not doc or not doc.get('sha256') or not doc.get('file_path') or not os.path.exists(doc['file_path']):
+            return None
+        return {'path': doc['file_path'], 'sha256': doc['sha256'],
+                'size': doc.get('file_size') or os.path.getsize(doc['file_path'])}
+
+    def _dedup_file(self, file_info):
+        """同一内容以不同标题发布时只保留一份文件"""
+        sha256, path = file_info['sha256'], file_info['path']
+        existing = self._paths_by_hash.get(sha256)
+        if existing is None:
+            doc = self.report_mongo.find_one({'sha256': sha256}, {'file_path': 1})
+            existing = doc.get('file_path') if doc else None
         
-        for attempt in range(max_retries):
-            try:
-                response = request_with_retry(url, method='get')
-                if response and response.status_code == 200:
-                    with open(filepath, 'wb') as f:
-                        f.write(response.content)
-                    print(f"  [下载] {filename} -> {filepath}")
-                    return
-            except Exception as e:
-                print(f"  [重试] {attempt + 1}/{max_retries}: {str(e)}")
-                time.sleep(2)
+        if existing and existing != path and os.path.exists(existing):
+            os.remove(path)
+            print(f"  [去重] 内容与 {existing} 相同，删除 {path}")
+            return dict(file_info, path=existing)
+        self._paths_by_hash[sha256] = path
+        return file_info
     
     def cleanup(self):
         """清理资源"""
         try:
-            self.browser.quit()
-            print("[ReportCrawler] 浏览器已关闭")
+            self.report_writer.close()
         except Exception as e:
-            print(f"[ReportCrawler] 关闭浏览器失败: {str(e)}")
+            print(f"[ReportCrawler] 写入缓冲数据失败: {str(e)}")
+        self._write_executor.shutdown()
+        try:
+            self.release_browser()
+            print("[ReportCrawler] 浏览器已归还")
+        except Exception as e:
+            print(f"[ReportCrawler] 归还浏览器失败: {str(e)}")
 
 
 class NewsCrawler:
@@ -240,33 +691,121 @@ class NewsCrawler:
         self.stock_code = stock_code
         self.stock_name = stock_name
         self.mongo = MongoAPI('stock_sentiment', f'news_{stock_code}')
+        self.writer = self.mongo.bulk_writer()
+        self.state = CrawlState(stock_code, 'news') if INCREMENTAL_CRAWL else None
+        self.dedup = get_dedup_index(stock_code, 'news') if DEDUP_ENABLED else None
+        self.failed_pages = 0  # 请求失败的页数，有失败页时不推进高水位线
+
+    def page_url(self, page):
+        """资讯检索第page页的地址（未配置news模板时返回None）"""
+        base_url = URL_TEMPLATES.get('news', '').format(stock_name=self.stock_name)
+        return f"{base_url}&pageindex={page}" if base_url else None
 
     def crawl_news(self, pages=1):
         """爬取资讯列表并存入MongoDB"""
+        async def _run():
+            async with AsyncFetcher() as fetcher:
+                await self.crawl_news_async(fetcher, pages=pages)
+        run_sync(_run())
+
+    async def crawl_news_async(self, fetcher, pages=1):
+        """使用共享抓取器请求各页资讯并存入MongoDB（首次爬取并发请求，增量模式逐页请求并提前停止）"""
         base_url = URL_TEMPLATES.get('news', '').format(stock_name=self.stock_name)
         if not base_url:
             print(f"[NewsCrawler] 未配置news URL模板，跳过")
             return
 
+        self.failed_pages = 0
         try:
-            for page in range(1, pages + 1):
-                page_url = f"{base_url}&pageindex={page}"
-                print(f"[NewsCrawler] 爬取第{page}页: {page_url}")
-                response = request_with_retry(page_url)
-                if not response:
-                    print(f"[NewsCrawler] 请求失败: {page_url}")
-                    continue
+            page_urls = [self.page_url(page) for page in range(1, pages + 1)]
+            if self.state is not None and self.state.has_history:
+                print(f"[NewsCrawler] 增量爬取(上次至{self.state.last_date}): {base_url}")
+                for page_url in page_urls:
+                    html = await fetcher.fetch_text(page_url)
+                    if self.save_page(page_url, html) == 0:
+                        print(f"[NewsCrawler] 无新资讯，停止翻页: {page_url}")
+                        break
+            else:
+                print(f"[NewsCrawler] 并发爬取{len(page_urls)}页: {base_url}")
+                html_list = await fetcher.fetch_all_text(page_urls)
+                for page_url, html in zip(page_urls, html_list):
+                    self.save_page(page_url, html)
 
-                # 解析新闻列表
-                news_list = NewsParser.parse_news_from_html(response.text)
-                print(f"[NewsCrawler] 解析到 {len(news_list)} 条资讯")
-                for news in news_list:
-                    try:
-                        self.mongo.insert_one(news)
-                    except Exception as e:
-                        print(f"  [NewsCrawler] 存储单条资讯失败: {str(e)}")
-                
-                time.sleep(1)
+            self.commit_state()
 
         except Exception as e:
             print(f"[NewsCrawler] 爬取异常: {str(e)}")
+
+    def commit_state(self):
+        """写入缓冲数据后持久化高水位线（有失败页时只写入数据，下次运行仍从原高水位线补爬）"""
+        if self.state is not None:
+            self.writer.flush()
+            if self.failed_pages:
+                print(f"[NewsCrawler] {self.failed_pages}页爬取失败，不更新高水位线")
+                return
+            self.state.save()
+
+    def save_page(self, page_url, html):
+        """解析并保存一页资讯，返回新资讯条数（含近重复，请求失败返回None）"""
+        if not html:
+            print(f"[NewsCrawler] 请求失败: {page_url}")
+            self.failed_pages += 1
+            return None
+
+        # 解析新闻列表
+        with metrics.timer('crawl_stage_seconds', stage='parse', source='news', stock=self.stock_code):
+            news_list = NewsParser.parse_news_from_html(html)
+        print(f"[NewsCrawler] 解析到 {len(news_list)} 条资讯")
+        for news in news_list:
+            news['_id'] = make_doc_id(self.stock_code, news['news_title'], news['news_date'])
+        stored = self._stored_ids(news_list)
+        new_count = 0
+        saved = 0
+        for news in news_list:
+            try:
+                if self.state is not None:
+                    if news['_id'] in stored or not (self.state.is_new(item_date=news['news_date'])
+                                                     or self.state.is_last_day(news['news_date'])):
+                        continue
+                    self.state.advance(item_date=news['news_date'])
+                new_count += 1
+                if self.dedup is not None:
+                    keep = self.dedup.mark(news)
+                    if 'dup_of' in news:
+                        metrics.inc('crawl_duplicates_total', source='news', stock=self.stock_code)
+                        print(f"  [近重复] {news['news_title'][:30]} -> {news['dup_of']}")
+                    if not keep:
+                        continue
+                self.writer.upsert(news)
+                saved += 1
+            except Exception as e:
+                print(f"  [NewsCrawler] 存储单条资讯失败: {str(e)}")
+        metrics.inc('crawl_items_total', saved, source='news', stock=self.stock_code)
+        return new_count
+
+    def _stored_ids(self, news_list):
+        """与高水位线同一天的资讯中已入库的_id（这些资讯不算新资讯，也不再做近重复检测）"""
+        if self.state is None:
+            return set()
+        ids = [news['_id'] for news in news_list if self.state.is_last_day(news['news_date'])]
+        if not ids:
+            return set()
+        return {doc['_id'] for doc in self.mongo.find({'_id': {'$in': ids}}, {'_id': 1})}
+
+    def cleanup(self):
+        """清理资源"""
+        try:
+            self.writer.close()
+        except Exception as e:
+            print(f"[NewsCrawler] 写入缓冲数据失败: {str(e)}")
+
+
+async def crawl_news_for_stocks(stock_list, pages=1):
+    """多只股票的资讯共享一个连接池并发抓取"""
+    crawlers = [NewsCrawler(stock_code, stock_name) for stock_code, stock_name in stock_list]
+    try:
+        async with AsyncFetcher() as fetcher:
+            await asyncio.gather(*(crawler.crawl_news_async(fetcher, pages=pages) for crawler in crawlers))
+    finally:
+        for crawler in crawlers:
+            crawler.cleanup()
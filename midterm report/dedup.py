@@ -0,0 +1,187 @@
+"""
+近重复检测
+入库前为发帖/资讯标题计算64位SimHash（字符n-gram），按股票维护LSH分段索引：
+与已入库标题汉明距离不超过阈值的视为近重复，以dup_of指向首条（或直接丢弃），
+分词、打分、主题和汇总只处理非重复的文档
+"""
+
+import hashlib
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from config import DEDUP_MODE, DEDUP_MAX_DISTANCE, DEDUP_SHINGLE, DEDUP_MIN_LENGTH
+from mongodb import MongoAPI
+from utils import normalize_text
+
+SIMHASH_BITS = 64
+_MASK = (1 << SIMHASH_BITS) - 1
+_BIT_SHIFTS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+# 分段数须大于汉明距离阈值：距离不超过阈值的两个指纹至少有一段完全相同
+_BANDS = DEDUP_MAX_DISTANCE + 1
+_BAND_BITS = SIMHASH_BITS // _BANDS
+
+# 下游NLP阶段的查询条件：只处理非重复文档
+NOT_DUPLICATE = {'dup_of': {'$exists': False}}
+
+_CLEAN_PATTERN = re.compile(r'[^\u4e00-\u9fff\w]')
+
+# 各数据源的集合名前缀与标题字段
+SOURCES = {
+    'post': ('post_', 'post_title'),
+    'news': ('news_', 'news_title'),
+}
+
+
+def clean_title(text):
+    """规范化并去掉标点空白，转载时常见的【】、“”等差异不影响指纹"""
+    return _CLEAN_PATTERN.sub('', normalize_text(text)).lower()
+
+
+def simhash(text, shingle=DEDUP_SHINGLE):
+    """对已清洗文本的字符n-gram计算64位SimHash（各特征哈希按位加权投票，用numpy一次完成）"""
+    if len(text) <= shingle:
+        features = Counter([text])
+    else:
+        features = Counter(text[i:i + shingle] for i in range(len(text) - shingle + 1))
+    hashes = np.frombuffer(
+        b''.join(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest() for f in features), dtype='>u8')
+    bits = (hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)
+    counts = np.fromiter(features.values(), dtype=np.int64, count=len(features))
+    weights = counts @ (bits.astype(np.int64) * 2 - 1)
+    return int(np.packbits((weights > 0)[::-1]).view('>u8')[0])
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def to_int64(fingerprint):
+    """MongoDB只支持有符号64位整数"""
+    return fingerprint - (1 << SIMHASH_BITS) if fingerprint >> (SIMHASH_BITS - 1) else fingerprint
+
+
+def from_int64(value):
+    return value & _MASK
+
+
+def _bands(fingerprint):
+    return [(i, fingerprint >> (i * _BAND_BITS) & ((1 << _BAND_BITS) - 1)) for i in range(_BANDS)]
+
+
+class DedupIndex(object):
+    """
+    单只股票单个数据源的近重复索引（只收录非重复文档）
+    首次使用时从集合中加载已有指纹，之后随入库增量更新
+    """
+
+    def __init__(self, stock_code, source='post', db_name='stock_sentiment', max_distance=DEDUP_MAX_DISTANCE):
+        prefix, self.title_field = SOURCES[source]
+        self.stock_code = stock_code
+        self.source = source
+        self.max_distance = max_distance
+        self.mongo = MongoAPI(db_name, f'{prefix}{stock_code}')
+        self._exact = {}  # 清洗后的标题 -> 文档_id
+        self._fingerprints = {}  # 文档_id -> 指纹
+        self._buckets = {}  # (段序号, 段值) -> [文档_id]
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.checked = 0
+        self.duplicates = 0
+
+    def _load(self):
+        query = dict(NOT_DUPLICATE, simhash={'$exists': True})
+        for doc in self.mongo.find(query, {'simhash': 1, self.title_field: 1}):
+            self._add(doc['_id'], clean_title(doc.get(self.title_field)), from_int64(doc['simhash']))
+        self._loaded = True
+
+    def _add(self, doc_id, text, fingerprint):
+        self._exact.setdefault(text, doc_id)
+        self._fingerprints[doc_id] = fingerprint
+        for band in _bands(fingerprint):
+            self._buckets.setdefault(band, []).append(doc_id)
+
+    def _nearest(self, fingerprint):
+        for band in _bands(fingerprint):
+            for candidate in self._buckets.get(band, ()):
+                if hamming_distance(fingerprint, self._fingerprints[candidate]) <= self.max_distance:
+                    return candidate
+        return None
+
+    def check(self, doc_id, title):
+        """
+        返回 (指纹, 首条文档_id)；不是近重复时首条为None，并把该文档加入索引
+        同一_id重复入库（如重新爬取）不会被判为自身的重复
+        """
+        text = clean_title(title)
+        fingerprint = simhash(text)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self.checked += 1
+            if doc_id in self._fingerprints:
+                return fingerprint, None
+            original = self._exact.get(text)
+            if original is None and len(text) >= DEDUP_MIN_LENGTH:
+                original = self._nearest(fingerprint)
+            if original is not None and original != doc_id:
+                self.duplicates += 1
+                return fingerprint, original
+            self._add(doc_id, text, fingerprint)
+            return fingerprint, None
+
+    def mark(self, doc):
+        """
+        入库前标记文档：写入simhash，近重复时写入dup_of
+        返回False表示应丢弃（DEDUP_MODE为"drop"且是近重复）
+        """
+        fingerprint, original = self.check(doc['_id'], doc.get(self.title_field))
+        doc['simhash'] = to_int64(fingerprint)
+        if original is None:
+            return True
+        doc['dup_of'] = original
+        return DEDUP_MODE != 'drop'
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_dedup_index(stock_code, source='post', db_name='stock_sentiment'):
+    """获取进程内共享的近重复索引，同一股票的多个爬虫实例共用"""
+    key = (db_name, stock_code, source)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = DedupIndex(stock_code, source, db_name)
+            _indexes[key] = index
+        return index
+
+
+def reset_dedup_indexes():
+    """丢弃内存中的索引（如切换数据库后），下次使用时重新加载"""
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def dedup_existing(stock_code, source='post', db_name='stock_sentiment'):
+    """为尚未计算指纹的历史文档补做近重复标记（按_id顺序），返回标记为重复的条数"""
+    prefix, title_field = SOURCES[source]
+    mongo = MongoAPI(db_name, f'{prefix}{stock_code}')
+    index = get_dedup_index(stock_code, source, db_name)
+    docs = list(mongo.find({'simhash': {'$exists': False}}, {title_field: 1}).sort('_id', 1))
+    duplicates = 0
+    with mongo.bulk_writer() as writer:
+        for doc in docs:
+            fingerprint, original = index.check(doc['_id'], doc.get(title_field))
+            if original is None:
+                writer.upsert({'_id': doc['_id'], 'simhash': to_int64(fingerprint)})
+                continue
+            # dup_of是导出列，清除exported使下次增量导出写入新行
+            writer.update({'_id': doc['_id']}, {'$set': {'simhash': to_int64(fingerprint), 'dup_of': original},
+                                                '$unset': {'exported': ''}})
+            duplicates += 1
+    print(f"[Dedup] {stock_code} {source} 补算{len(docs)}条，近重复{duplicates}条")
+    return duplicates
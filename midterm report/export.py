@@ -0,0 +1,242 @@
+"""
+Parquet快照导出
+把发帖、资讯、研报和情感分数增量导出为按 stock=/date= 分区的Parquet数据集（Hive分区目录），
+文本列使用字典编码；读取时按股票和日期做分区裁剪与谓词下推，只读需要的文件和列
+"""
+
+import os
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from config import STOCK_LIST, EXPORT_DIR, EXPORT_BATCH_SIZE
+from mongodb import MongoAPI
+from sentiment_rollup import parse_post_time
+from utils import create_dir
+
+_DICT = pa.dictionary(pa.int32(), pa.string())
+
+
+def _post_date(doc):
+    timestamp = parse_post_time(doc.get('post_date'), doc.get('post_time'))
+    return timestamp.date().isoformat() if timestamp else None
+
+
+def _download_date(doc):
+    return (doc.get('download_time') or '')[:10] or None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# 数据集名 -> 导出配置
+#   collection: 源集合名前缀；flag: 已导出标记字段；query: 额外筛选条件；date: 文档 -> 分区日期
+#   columns: (列名, Arrow类型, 文档 -> 值)，重复率高的文本列用字典编码
+DATASETS = {
+    'posts': {
+        'collection': 'post_',
+        'flag': 'exported',
+        'query': {},
+        'date': _post_date,
+        'columns': [
+            ('_id', pa.string(), lambda d: str(d['_id'])),
+            ('post_title', pa.string(), lambda d: d.get('post_title')),
+            ('post_author', _DICT, lambda d: d.get('post_author')),
+            ('post_time', pa.string(), lambda d: d.get('post_time')),
+            ('post_reply', pa.int64(), lambda d: _to_int(d.get('post_reply'))),
+            ('post_like', pa.int64(), lambda d: _to_int(d.get('post_like'))),
+            ('post_click', pa.int64(), lambda d: _to_int(d.get('post_click'))),
+            ('post_url', pa.string(), lambda d: d.get('post_url')),
+            ('dup_of', _DICT, lambda d: d.get('dup_of')),
+        ],
+    },
+    'news': {
+        'collection': 'news_',
+        'flag': 'exported',
+        'query': {},
+        'date': lambda d: d.get('news_date'),
+        'columns': [
+            ('_id', pa.string(), lambda d: str(d['_id'])),
+            ('news_title', pa.string(), lambda d: d.get('news_title')),
+            ('news_url', pa.string(), lambda d: d.get('news_url')),
+            ('news_time', pa.string(), lambda d: d.get('news_time')),
+            ('news_source', pa.string(), lambda d: d.get('news_source')),
+            ('dup_of', _DICT, lambda d: d.get('dup_of')),
+        ],
+    },
+    'reports': {
+        'collection': 'report_',
+        'flag': 'exported',
+        'query': {},
+        'date': _download_date,
+        'columns': [
+            ('_id', pa.string(), lambda d: str(d['_id'])),
+            ('report_title', pa.string(), lambda d: d.get('report_title')),
+            ('report_url', pa.string(), lambda d: d.get('report_url')),
+            ('sha256', pa.string(), lambda d: d.get('sha256')),
+            ('file_size', pa.int64(), lambda d: d.get('file_size')),
+            ('rating', _DICT, lambda d: d.get('rating')),
+            ('target_price', pa.float64(), lambda d: d.get('target_price')),
+            ('page_count', pa.int64(), lambda d: d.get('page_count')),
+        ],
+    },
+    'sentiment': {
+        'collection': 'post_',
+        'flag': 'sentiment_exported',
+        'query': {'pos_p': {'$ne': None}},
+        'date': _post_date,
+        'columns': [
+            ('_id', pa.string(), lambda d: str(d['_id'])),
+            ('post_time', pa.string(), lambda d: d.get('post_time')),
+            ('pos_p', pa.float64(), lambda d: d.get('pos_p')),
+            ('topic', pa.int64(), lambda d: d.get('topic')),
+        ],
+    },
+}
+
+_FLAG_CHUNK = 1000  # 每个标记更新操作包含的_id数
+_PARTITIONING = ds.partitioning(pa.schema([('stock', pa.string()), ('date', pa.string())]), flavor='hive')
+
+
+def dataset_schema(name):
+    """数据集的完整列结构（含分区列与导出时间）"""
+    fields = [pa.field(column, arrow_type) for column, arrow_type, _ in DATASETS[name]['columns']]
+    fields += [pa.field('exported_at', pa.timestamp('ms')), pa.field('stock', pa.string()),
+               pa.field('date', pa.string())]
+    return pa.schema(fields)
+
+
+def dataset_path(name, root=EXPORT_DIR):
+    return os.path.join(root, name)
+
+
+class ParquetExporter(object):
+    """单只股票的增量导出：只导出未带已导出标记的文档，写入成功后再打标记"""
+
+    def __init__(self, stock_code, db_name='stock_sentiment', root=EXPORT_DIR, batch_size=EXPORT_BATCH_SIZE):
+        self.stock_code = stock_code
+        self.db_name = db_name
+        self.root = root
+        self.batch_size = batch_size
+
+    def export(self, name):
+        """导出一个数据集的新增文档，返回导出条数"""
+        spec = DATASETS[name]
+        mongo = MongoAPI(self.db_name, f"{spec['collection']}{self.stock_code}")
+        query = dict(spec['query'], **{spec['flag']: {'$exists': False}})
+        projection = {column: 1 for column, _, _ in spec['columns']}
+        projection.update({'post_date': 1, 'news_date': 1, 'download_time': 1})
+        docs = list(mongo.find(query, projection))
+        if not docs:
+            return 0
+
+        run_id = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        exported = 0
+        for i in range(0, len(docs), self.batch_size):
+            batch = docs[i:i + self.batch_size]
+            self._write(name, spec, batch, f"{run_id}-{i // self.batch_size}")
+            # 文件写入成功后再标记，中途失败时下次重新导出（读取时按_id去重）
+            with mongo.bulk_writer() as writer:
+                for j in range(0, len(batch), _FLAG_CHUNK):
+                    ids = [doc['_id'] for doc in batch[j:j + _FLAG_CHUNK]]
+                    writer.update_many({'_id': {'$in': ids}}, {'$set': {spec['flag']: True}})
+            exported += len(batch)
+        print(f"[Export] {self.stock_code} {name} 导出{exported}条 -> {dataset_path(name, self.root)}")
+        return exported
+
+    def _write(self, name, spec, docs, part_id):
+        exported_at = datetime.now()
+        columns = {column: [getter(doc) for doc in docs] for column, _, getter in spec['columns']}
+        columns['exported_at'] = [exported_at] * len(docs)
+        columns['stock'] = [self.stock_code] * len(docs)
+        columns['date'] = [spec['date'](doc) or 'unknown' for doc in docs]
+        table = pa.table(columns, schema=dataset_schema(name))
+
+        path = create_dir(dataset_path(name, self.root))
+        file_format = ds.ParquetFileFormat()
+        ds.write_dataset(
+            table, path,
+            format=file_format,
+            file_options=file_format.make_write_options(compression='zstd', use_dictionary=True),
+            partitioning=_PARTITIONING,
+            basename_template=f"part-{part_id}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+        )
+
+    def export_all(self, names=None):
+        """导出多个数据集，返回 {数据集名: 导出条数}"""
+        return {name: self.export(name) for name in (names or DATASETS)}
+
+
+def export_stocks(stock_list=STOCK_LIST, names=None, root=EXPORT_DIR):
+    """导出多只股票的全部数据集"""
+    totals = {}
+    for stock_code, _ in stock_list:
+        try:
+            for name, count in ParquetExporter(stock_code, root=root).export_all(names).items():
+                totals[name] = totals.get(name, 0) + count
+        except Exception as e:
+            print(f"[Export] {stock_code} 导出异常: {str(e)}")
+    return totals
+
+
+def compact(name, stock_code, root=EXPORT_DIR):
+    """把该股票各日期分区中多次增量导出的小文件合并为一个文件（同一文档只保留最后一次导出），返回合并的分区数"""
+    stock_dir = os.path.join(dataset_path(name, root), f'stock={stock_code}')
+    if not os.path.isdir(stock_dir):
+        return 0
+    schema = dataset_schema(name)
+    compacted = 0
+    for entry in os.scandir(stock_dir):
+        files = sorted(f.path for f in os.scandir(entry.path) if f.name.endswith('.parquet')) if entry.is_dir() else []
+        if len(files) <= 1:
+            continue
+        table = ds.dataset(files, format='parquet', schema=schema).to_table()
+        df = table.to_pandas().sort_values('exported_at').drop_duplicates('_id', keep='last')
+        merged = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        target = os.path.join(entry.path, f"compact-{datetime.now().strftime('%Y%m%d%H%M%S%f')}.parquet")
+        pq.write_table(merged.drop_columns(['stock', 'date']), target + '.part', compression='zstd')
+        os.replace(target + '.part', target)
+        for path in files:
+            os.remove(path)
+        compacted += 1
+    print(f"[Export] {stock_code} {name} 合并{compacted}个分区")
+    return compacted
+
+
+def load_dataset(name, stock_code=None, start=None, end=None, columns=None, root=EXPORT_DIR, latest_only=True):
+    """
+    读取数据集为DataFrame：stock/start/end（日期字符串，含两端）用于分区裁剪，columns只读取指定列
+    同一文档被多次导出时 latest_only=True 只保留最后一次导出的版本
+    """
+    path = dataset_path(name, root)
+    if not os.path.isdir(path):
+        return dataset_schema(name).empty_table().to_pandas()
+    dataset = ds.dataset(path, format='parquet', partitioning=_PARTITIONING, schema=dataset_schema(name))
+
+    condition = None
+    for expression in (
+        pc.field('stock') == stock_code if stock_code else None,
+        pc.field('date') >= start if start else None,
+        pc.field('date') <= end if end else None,
+    ):
+        if expression is not None:
+            condition = expression if condition is None else condition & expression
+
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys(list(columns) + (['_id', 'exported_at'] if latest_only else [])))
+    table = dataset.to_table(columns=read_columns, filter=condition)
+    df = table.to_pandas()
+    if latest_only and len(df):
+        df = df.sort_values('exported_at').drop_duplicates('_id', keep='last')
+        if columns is not None:
+            df = df[list(columns)]
+    return df.reset_index(drop=True)
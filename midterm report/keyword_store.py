@@ -0,0 +1,247 @@
+"""
+增量关键词词频
+按股票、按天维护分词后的词频计数，查询时按需合并任意时间窗口，
+可选用有界内存的Space-Saving草图近似长尾；窗口Top-K结果与词云图片按(股票, 窗口)缓存
+"""
+
+import hashlib
+import heapq
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from config import KEYWORD_CACHE_TTL, KEYWORD_SKETCH_CAPACITY, WORDCLOUD_DIR, WORDCLOUD_FONT_PATH
+from dedup import NOT_DUPLICATE
+from mongodb import MongoAPI
+from sentiment_rollup import parse_post_time
+from utils import create_dir
+
+
+class SpaceSaving(object):
+    """
+    Space-Saving重频项草图：最多保留capacity个计数器，
+    计数器满时新词替换当前最小计数器并继承其计数，估计值误差不超过error
+    最小计数器用小顶堆查找（计数变化时压入新条目，旧条目在弹出时惰性丢弃），每次替换O(log capacity)
+    """
+
+    def __init__(self, capacity=KEYWORD_SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = []  # (计数, 词)，可能含过期条目
+
+    def add(self, item, count=1):
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            victim, floor = self._pop_min()
+            del self.counts[victim]
+            del self.errors[victim]
+            self.counts[item] = floor + count
+            self.errors[item] = floor
+        heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(n, word) for word, n in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        """弹出当前计数最小的词，跳过计数已变化或已被替换的过期条目"""
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return item, count
+
+    def update(self, counts):
+        """批量加入 {词: 次数}，按次数从大到小加入以减少替换"""
+        for item, count in sorted(counts.items(), key=lambda kv: kv[1], reverse=True):
+            self.add(item, count)
+
+    def top(self, k):
+        """返回估计次数最高的k个 (词, 次数)"""
+        return Counter(self.counts).most_common(k)
+
+
+def _valid_word(word):
+    """MongoDB字段名不能含'.'或以'$'开头"""
+    return bool(word) and '.' not in word and not word.startswith('$')
+
+
+def last_days(days, end=None):
+    """最近days天的窗口，返回 (start, end) 日期字符串（含两端）"""
+    end = end or date.today()
+    return (end - timedelta(days=days - 1)).isoformat(), end.isoformat()
+
+
+# (stock_code, start, end, k, approximate) -> (过期时间, 结果)
+_top_cache = {}
+_top_cache_lock = threading.Lock()
+
+
+class KeywordStore(object):
+    """单只股票的按天词频表 keyword_daily_{stock_code}，文档_id为日期 YYYY-MM-DD"""
+
+    def __init__(self, stock_code, db_name='stock_sentiment'):
+        self.stock_code = stock_code
+        self.post_mongo = MongoAPI(db_name, f'post_{stock_code}')
+        self.daily_mongo = MongoAPI(db_name, f'keyword_daily_{stock_code}')
+
+    def apply_new_posts(self):
+        """
+        把已分词但尚未计数的发帖计入按天词频，返回处理条数
+        词频不做$inc累加，而是按发帖的kw_day重新计算涉及的每一天后整体覆盖：
+        依次写入kw_day、覆盖当天词频、标记kw_counted，任一步中断后重跑结果相同，不会重复计数
+        """
+        posts = list(self.post_mongo.find(
+            dict(NOT_DUPLICATE, tokens={'$exists': True},
+                 **{'$or': [{'kw_counted': {'$exists': False}}, {'kw_day': {'$exists': False}}]}),
+            {'post_date': 1, 'post_time': 1}
+        ))
+        if not posts:
+            return 0
+
+        # 1. 记录发帖所属的日期（无法解析的记为None，不计入任何一天）
+        days = set()
+        with self.post_mongo.bulk_writer() as writer:
+            for post in posts:
+                timestamp = parse_post_time(post.get('post_date'), post.get('post_time'))
+                day = timestamp.date().isoformat() if timestamp is not None else None
+                if day is not None:
+                    days.add(day)
+                writer.upsert({'_id': post['_id'], 'kw_day': day})
+
+        # 2. 按当天全部已分词发帖重新计算词频，同时写入摘要
+        counters = self._compute_days(sorted(days))
+        with self.daily_mongo.bulk_writer() as writer:
+            for day in days:
+                counter = counters.get(day, Counter())
+                total = sum(counter.values())
+                writer.update({'_id': day}, {'$set': {
+                    'counts': dict(counter),
+                    'total': total,
+                    'summary': dict(counter.most_common(KEYWORD_SKETCH_CAPACITY)),
+                    'summary_total': total,
+                }}, upsert=True)
+
+        # 3. 词频写入成功后再标记发帖
+        with self.post_mongo.bulk_writer() as writer:
+            for post in posts:
+                writer.upsert({'_id': post['_id'], 'kw_counted': True})
+        self.invalidate_cache()
+        print(f"[KeywordStore] {self.stock_code} 计入{len(posts)}条发帖，重算{len(days)}天的词频")
+        return len(posts)
+
+    def _compute_days(self, days, chunk_size=200):
+        """从发帖重新计算给定各天的词频，返回 {日期: Counter}"""
+        counters = defaultdict(Counter)
+        for i in range(0, len(days), chunk_size):
+            query = dict(NOT_DUPLICATE, tokens={'$exists': True}, kw_day={'$in': days[i:i + chunk_size]})
+            for post in self.post_mongo.find(query, {'tokens': 1, 'kw_day': 1}):
+                counters[post['kw_day']].update(w for w in post.get('tokens') or [] if _valid_word(w))
+        return counters
+
+    def _refresh_summaries(self, days):
+        """
+        重算各天的摘要（当天最高频的KEYWORD_SKETCH_CAPACITY个词），近似查询只读取摘要而不读完整词频
+        summary_total记录摘要对应的总词数，与total不一致（如写入中断）时视为过期
+        """
+        if not days:
+            return
+        with self.daily_mongo.bulk_writer() as writer:
+            for doc in self.daily_mongo.find({'_id': {'$in': days}}, {'counts': 1, 'total': 1}):
+                top = Counter(doc.get('counts', {})).most_common(KEYWORD_SKETCH_CAPACITY)
+                writer.upsert({'_id': doc['_id'], 'summary': dict(top), 'summary_total': doc.get('total', 0)})
+
+    def invalidate_cache(self):
+        """清除该股票的Top-K缓存"""
+        with _top_cache_lock:
+            for key in [key for key in _top_cache if key[0] == self.stock_code]:
+                del _top_cache[key]
+
+    def _window_query(self, start=None, end=None):
+        query = {}
+        if start or end:
+            query['_id'] = {}
+            if start:
+                query['_id']['$gte'] = start
+            if end:
+                query['_id']['$lte'] = end
+        return query
+
+    def top_keywords(self, start=None, end=None, k=50, approximate=False):
+        """
+        合并[start, end]（日期字符串，含两端）内的按天词频，返回前k个 (词, 次数)
+        approximate=True 时用Space-Saving草图合并，内存不随词表大小增长
+        """
+        key = (self.stock_code, start, end, k, approximate)
+        now = time.monotonic()
+        with _top_cache_lock:
+            cached = _top_cache.get(key)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+
+        if approximate:
+            merged = SpaceSaving(max(KEYWORD_SKETCH_CAPACITY, k))
+            query = self._window_query(start, end)
+            stale = [doc['_id'] for doc in self.daily_mongo.find(query, {'total': 1, 'summary_total': 1})
+                     if doc.get('summary_total') != doc.get('total')]
+            self._refresh_summaries(stale)
+            for doc in self.daily_mongo.find(query, {'summary': 1}):
+                merged.update(doc.get('summary', {}))
+            result = merged.top(k)
+        else:
+            merged = Counter()
+            for doc in self.daily_mongo.find(self._window_query(start, end), {'counts': 1}):
+                merged.update(doc.get('counts', {}))
+            result = merged.most_common(k)
+
+        with _top_cache_lock:
+            _top_cache[key] = (now + KEYWORD_CACHE_TTL, result)
+        return result
+
+    def top_keywords_last_days(self, days=7, k=50, approximate=False):
+        """最近days天的Top-K关键词"""
+        start, end = last_days(days)
+        return self.top_keywords(start, end, k=k, approximate=approximate)
+
+    def _window_fingerprint(self, start=None, end=None):
+        """窗口内各天总词数的摘要，窗口数据有变化时摘要随之变化"""
+        hasher = hashlib.sha1()
+        for doc in self.daily_mongo.find(self._window_query(start, end), {'total': 1}).sort('_id', 1):
+            hasher.update(f"{doc['_id']}:{doc.get('total', 0)};".encode('utf-8'))
+        return hasher.hexdigest()[:12]
+
+    def wordcloud_image(self, start=None, end=None, max_words=100, font_path=WORDCLOUD_FONT_PATH):
+        """
+        生成窗口内的词云PNG并返回路径
+        文件名包含窗口数据摘要，数据未变化时直接复用已生成的图片
+        """
+        create_dir(WORDCLOUD_DIR)
+        fingerprint = self._window_fingerprint(start, end)
+        filepath = os.path.join(
+            WORDCLOUD_DIR, f"{self.stock_code}_{start or 'all'}_{end or 'all'}_{max_words}_{fingerprint}.png"
+        )
+        if os.path.exists(filepath):
+            return filepath
+
+        frequencies = dict(self.top_keywords(start, end, k=max_words))
+        if not frequencies:
+            print(f"[KeywordStore] {self.stock_code} 窗口内没有关键词")
+            return None
+
+        from wordcloud import WordCloud
+        image = WordCloud(
+            font_path=font_path,
+            width=800,
+            height=600,
+            background_color='white',
+            colormap='viridis',
+            max_words=max_words
+        ).generate_from_frequencies(frequencies)
+        image.to_image().save(filepath + '.part', format='PNG')
+        os.replace(filepath + '.part', filepath)
+        return filepath
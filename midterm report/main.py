@@ -6,23 +6,36 @@ sentiment_crawler 主程序
 import threading
 import time
 from datetime import datetime
-from config import STOCK_LIST, CRAWL_PAGES, USE_MULTITHREAD
-from crawlers import PostCrawler, CommentCrawler, ReportCrawler, NewsCrawler
+from urllib.parse import urlsplit
+import os
+from config import (STOCK_LIST, CRAWL_PAGES, USE_MULTITHREAD, URL_TEMPLATES, POST_BACKEND, COMMENT_BACKEND, MAX_THREADS,
+                    METRICS_DIR, COMMENT_SELENIUM_MAX_POSTS)
+from crawlers import (PostCrawler, HttpPostCrawler, CommentCrawler, HttpCommentCrawler, ReportCrawler, NewsCrawler,
+                      crawl_news_for_stocks)
+from async_fetcher import run_sync, FetcherThread
+from browser_pool import close_browser_pool
+from scheduler import (TaskScheduler, PagedJob, PRIORITY_POST, PRIORITY_COMMENT, PRIORITY_REPORT, PRIORITY_NEWS,
+                       PRIORITY_DOWNLOAD)
+from mongodb import close_clients
+from report_extractor import extract_reports
 from utils import create_dir
+import metrics
 
 
-def post_thread(stock_code, stock_name, pages=CRAWL_PAGES):
+def post_thread(stock_code, stock_name, pages=CRAWL_PAGES, backend=POST_BACKEND):
     """
     发帖爬取线程
+    backend: "selenium"（浏览器渲染）或 "http"（直接请求页面内嵌数据）
     返回(开始日期, 结束日期)用于评论爬取
     """
-    print(f"\n[POST] 开始爬取{stock_name}({stock_code})的发帖...")
+    print(f"\n[POST] 开始爬取{stock_name}({stock_code})的发帖 (后端: {backend})...")
     start_time = time.time()
     
-    crawler = PostCrawler(stock_code)
+    crawler = HttpPostCrawler(stock_code) if backend == "http" else PostCrawler(stock_code)
     try:
         date_range = crawler.crawl_post_info(pages=pages)
         elapsed = time.time() - start_time
+        metrics.observe('crawl_stage_seconds', elapsed, stage='total', source='post', stock=stock_code)
         print(f"[POST] 完成 - 用时{elapsed:.2f}秒, 日期范围: {date_range}")
         return date_range
     except Exception as e:
@@ -32,30 +45,39 @@ def post_thread(stock_code, stock_name, pages=CRAWL_PAGES):
         crawler.cleanup()
 
 
-def comment_thread_date(stock_code, stock_name, start_date, end_date):
+def comment_thread_date(stock_code, stock_name, start_date, end_date, backend=COMMENT_BACKEND, fetcher=None):
     """
     按日期范围爬取评论的线程
+    backend: "http"（多个帖子并发请求评论分页）或 "selenium"（逐帖浏览器加载）
+    fetcher: 调度器共享的FetcherThread（HTTP后端复用其连接池，未传入时单独创建）
     """
     if start_date is None or end_date is None:
         print(f"[COMMENT] 跳过 - 日期范围无效: {start_date} ~ {end_date}")
         return
     
-    print(f"\n[COMMENT] 开始爬取{stock_name}({stock_code})的评论 ({start_date} ~ {end_date})...")
+    print(f"\n[COMMENT] 开始爬取{stock_name}({stock_code})的评论 ({start_date} ~ {end_date}, 后端: {backend})...")
     start_time = time.time()
     
-    crawler = CommentCrawler(stock_code)
+    crawler = HttpCommentCrawler(stock_code) if backend == "http" else CommentCrawler(stock_code)
     try:
         posts = crawler.find_by_date(start_date, end_date)
         if not posts:
             print(f"[COMMENT] 未找到目标日期范围内的发帖")
             return
         
-        # 可选：爬取各帖子的评论
-        # for post in posts[:5]:  # 限制为前5条避免过长
-        #     post_url = f"https://guba.eastmoney.com/news,{post['_id']}.html"
-        #     crawler.crawl_comment_info(post_url, post['_id'])
+        if backend == "http" and fetcher is not None:
+            fetcher.run(crawler.crawl_comments_async(fetcher.fetcher, posts))
+        elif backend == "http":
+            crawler.crawl_comments(posts)
+        else:
+            # 只有列表页解析出帖子ID的发帖才有评论页（其余发帖的_id为内容哈希）
+            posts = [post for post in posts if post.get('post_id')][:COMMENT_SELENIUM_MAX_POSTS]
+            for post in posts:
+                post_url = URL_TEMPLATES['post'].format(stock_code=stock_code, post_id=post['post_id'])
+                crawler.crawl_comment_info(post_url, post['post_id'])
         
         elapsed = time.time() - start_time
+        metrics.observe('crawl_stage_seconds', elapsed, stage='total', source='comment', stock=stock_code)
         print(f"[COMMENT] 完成 - 用时{elapsed:.2f}秒")
     
     except Exception as e:
@@ -75,6 +97,7 @@ def report_thread(stock_code, stock_name, pages=CRAWL_PAGES):
     try:
         crawler.crawl_stock_reports(pages=pages)
         elapsed = time.time() - start_time
+        metrics.observe('crawl_stage_seconds', elapsed, stage='total', source='report', stock=stock_code)
         print(f"[REPORT] 完成 - 用时{elapsed:.2f}秒")
     except Exception as e:
         print(f"[REPORT] 异常: {str(e)}")
@@ -93,12 +116,31 @@ def news_thread(stock_code, stock_name, pages=CRAWL_PAGES):
     try:
         crawler.crawl_news(pages=pages)
         elapsed = time.time() - start_time
+        metrics.observe('crawl_stage_seconds', elapsed, stage='total', source='news', stock=stock_code)
+        print(f"[NEWS] 完成 - 用时{elapsed:.2f}秒")
+    except Exception as e:
+        print(f"[NEWS] 异常: {str(e)}")
+    finally:
+        crawler.cleanup()
+
+
+def news_all_stocks(stock_list, pages=CRAWL_PAGES):
+    """
+    所有股票的资讯共享一个连接池并发抓取
+    """
+    print(f"\n[NEWS] 开始并发抓取{len(stock_list)}只股票的资讯...")
+    start_time = time.time()
+
+    try:
+        run_sync(crawl_news_for_stocks(stock_list, pages=pages))
+        elapsed = time.time() - start_time
         print(f"[NEWS] 完成 - 用时{elapsed:.2f}秒")
     except Exception as e:
         print(f"[NEWS] 异常: {str(e)}")
 
 
-def sentiment_pipeline_thread(stock_code, stock_name, crawl_comment=False, crawl_report=True, crawl_news=True, pages=CRAWL_PAGES):
+def sentiment_pipeline_thread(stock_code, stock_name, crawl_comment=False, crawl_report=True, crawl_news=True, pages=CRAWL_PAGES,
+                              post_backend=POST_BACKEND):
     """
     主管道：协调发帖、评论、研报的爬取
     
@@ -108,6 +150,7 @@ def sentiment_pipeline_thread(stock_code, stock_name, crawl_comment=False, crawl
         crawl_comment: 是否爬取评论（默认False）
         crawl_report: 是否下载研报（默认True）
         pages: 每个模块爬取的页数
+        post_backend: 发帖爬取后端（"selenium"或"http"）
     """
     print(f"\n{'='*60}")
     print(f"[PIPELINE] 开始处理 {stock_name}({stock_code})")
@@ -118,7 +161,7 @@ def sentiment_pipeline_thread(stock_code, stock_name, crawl_comment=False, crawl
     
     try:
         # 1. 爬取发帖（获取日期范围）
-        start_date, end_date = post_thread(stock_code, stock_name, pages=pages)
+        start_date, end_date = post_thread(stock_code, stock_name, pages=pages, backend=post_backend)
         
         # 2. 爬取评论（如果启用）
         if crawl_comment:
@@ -136,8 +179,145 @@ def sentiment_pipeline_thread(stock_code, stock_name, crawl_comment=False, crawl
         print(f"[PIPELINE] 异常: {str(e)}")
 
 
-def run_all_stocks_sequential(crawl_comment=False, crawl_report=True, pages=CRAWL_PAGES):
-    """顺序处理所有股票"""
+def export_metrics(directory=METRICS_DIR):
+    """打印本次运行的指标汇总表，并导出JSON与Prometheus文本格式文件"""
+    registry = metrics.get_registry()
+    registry.print_summary()
+    run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    for suffix in ('json', 'prom'):
+        path = registry.export(os.path.join(directory, f"metrics_{run_id}.{suffix}"))
+        print(f"[Metrics] 已导出: {path}")
+
+
+GUBA_HOST = urlsplit(URL_TEMPLATES['bar']).netloc
+SEARCH_HOST = urlsplit(URL_TEMPLATES['report']).netloc
+
+
+def schedule_posts(scheduler, fetcher, stock_code, stock_name, pages=CRAWL_PAGES, backend=POST_BACKEND, on_done=None):
+    """
+    发帖按页拆分为任务：浏览器后端逐页执行（每页借还一次浏览器），
+    HTTP后端首次爬取并发请求各页，增量模式逐页请求并在无新帖时停止
+    全部完成后以(开始日期, 结束日期)调用on_done
+    """
+    lock = threading.Lock()
+    crawler = HttpPostCrawler(stock_code) if backend == "http" else PostCrawler(stock_code)
+
+    def run_page(page):
+        try:
+            if backend == "http":
+                page_url = crawler.page_url(page)
+                html = fetcher.fetch_text(page_url)
+                with lock:
+                    return crawler.save_page(page_url, html)
+            return crawler.crawl_page(page)
+        except Exception:
+            with lock:
+                crawler.failed_pages += 1  # 有失败页时finish不推进高水位线
+            raise
+        finally:
+            if backend != "http":
+                crawler.release_browser()
+
+    def finish():
+        try:
+            crawler.commit_state()
+            date_range = (crawler.start_date, crawler.end_date)
+            print(f"[POST] {stock_name}({stock_code}) 完成, 日期范围: {date_range}")
+        finally:
+            crawler.cleanup()
+        if on_done is not None:
+            on_done(*date_range)
+
+    if backend == "http":
+        domains = (GUBA_HOST,)
+        sequential = crawler.state is not None and crawler.state.has_history
+    else:
+        domains = (GUBA_HOST, 'browser')
+        sequential = True
+    PagedJob(scheduler, f"post:{stock_code}", pages, run_page, on_finish=finish, priority=PRIORITY_POST,
+             domains=domains, sequential=sequential,
+             stop_when=lambda new_count: new_count == 0 and crawler.state is not None).start()
+
+
+def schedule_reports(scheduler, fetcher, stock_code, stock_name, pages=CRAWL_PAGES):
+    """研报列表逐页收集（占用浏览器），收集完成后每个PDF作为独立下载任务"""
+    reports = []
+    crawler = ReportCrawler(stock_code, stock_name)
+
+    def run_page(page):
+        try:
+            page_reports = crawler.collect_report_page(page)
+            reports.extend(page_reports or [])
+            return page_reports
+        finally:
+            crawler.release_browser()
+
+    def download(i):
+        fetcher.run(crawler.download_reports_async(fetcher.fetcher, [reports[i - 1]]))
+
+    def finish_list():
+        if not reports:
+            crawler.cleanup()
+            return
+        print(f"[REPORT] {stock_name}({stock_code}) 共{len(reports)}个研报，提交下载任务")
+        PagedJob(scheduler, f"report-pdf:{stock_code}", len(reports), download, on_finish=crawler.cleanup,
+                 priority=PRIORITY_DOWNLOAD, domains=lambda i: (urlsplit(reports[i - 1][1]).netloc,),
+                 sequential=False).start()
+
+    PagedJob(scheduler, f"report:{stock_code}", pages, run_page, on_finish=finish_list, priority=PRIORITY_REPORT,
+             domains=(SEARCH_HOST, 'browser')).start()
+
+
+def schedule_news(scheduler, fetcher, stock_code, stock_name, pages=CRAWL_PAGES):
+    """资讯按页拆分为任务，首次爬取并发请求，增量模式逐页请求并在无新资讯时停止"""
+    lock = threading.Lock()
+    crawler = NewsCrawler(stock_code, stock_name)
+    if crawler.page_url(1) is None:
+        print(f"[NEWS] 未配置news URL模板，跳过")
+        crawler.cleanup()
+        return
+
+    def run_page(page):
+        page_url = crawler.page_url(page)
+        try:
+            html = fetcher.fetch_text(page_url)
+            with lock:
+                return crawler.save_page(page_url, html)
+        except Exception:
+            with lock:
+                crawler.failed_pages += 1  # 有失败页时finish不推进高水位线
+            raise
+
+    def finish():
+        try:
+            crawler.commit_state()
+        finally:
+            crawler.cleanup()
+
+    incremental = crawler.state is not None and crawler.state.has_history
+    PagedJob(scheduler, f"news:{stock_code}", pages, run_page, on_finish=finish, priority=PRIORITY_NEWS,
+             domains=(SEARCH_HOST,), sequential=incremental, stop_when=lambda new_count: new_count == 0).start()
+
+
+def schedule_stock(scheduler, fetcher, stock_code, stock_name, crawl_comment=False, crawl_report=True, crawl_news=True,
+                   pages=CRAWL_PAGES, post_backend=POST_BACKEND):
+    """提交单只股票的全部任务：发帖完成后才提交评论任务，研报和资讯与发帖并行"""
+    def on_posts_done(start_date, end_date):
+        if crawl_comment:
+            domains = (GUBA_HOST,) if COMMENT_BACKEND == "http" else (GUBA_HOST, 'browser')
+            scheduler.submit(comment_thread_date, stock_code, stock_name, start_date, end_date, fetcher=fetcher,
+                             name=f"comment:{stock_code}", priority=PRIORITY_COMMENT, domains=domains)
+
+    schedule_posts(scheduler, fetcher, stock_code, stock_name, pages=pages, backend=post_backend, on_done=on_posts_done)
+    if crawl_report:
+        schedule_reports(scheduler, fetcher, stock_code, stock_name, pages=pages)
+    if crawl_news:
+        schedule_news(scheduler, fetcher, stock_code, stock_name, pages=pages)
+
+
+def run_all_stocks_sequential(crawl_comment=False, crawl_report=True, crawl_news=True, pages=CRAWL_PAGES,
+                              post_backend=POST_BACKEND):
+    """顺序处理所有股票（资讯统一并发抓取）"""
     print(f"\n[MAIN] 开始顺序爬取所有股票 ({len(STOCK_LIST)} 只)")
     start_time = time.time()
     
@@ -146,42 +326,54 @@ def run_all_stocks_sequential(crawl_comment=False, crawl_report=True, pages=CRAW
             sentiment_pipeline_thread(stock_code, stock_name, 
                                      crawl_comment=crawl_comment, 
                                      crawl_report=crawl_report, 
-                                     crawl_news=True,
-                                     pages=pages)
-            time.sleep(2)  # 请求间隔
+                                     crawl_news=False,
+                                     pages=pages,
+                                     post_backend=post_backend)
+
+        if crawl_news:
+            news_all_stocks(STOCK_LIST, pages=pages)
     
     except Exception as e:
         print(f"[MAIN] 异常: {str(e)}")
     
     finally:
+        close_browser_pool()
         elapsed = time.time() - start_time
         print(f"\n[MAIN] 全部完成 - 总用时{elapsed:.2f}秒")
 
 
-def run_all_stocks_multithread(crawl_comment=False, crawl_report=True, pages=CRAWL_PAGES):
-    """多线程处理所有股票"""
-    print(f"\n[MAIN] 开始多线程爬取所有股票 ({len(STOCK_LIST)} 只)")
+def run_all_stocks_multithread(crawl_comment=False, crawl_report=True, crawl_news=True, pages=CRAWL_PAGES,
+                               post_backend=POST_BACKEND, max_workers=MAX_THREADS):
+    """
+    多线程处理所有股票：按(股票, 数据源, 页)拆分任务，
+    由固定数量的工作线程按优先级和域名并发上限执行，HTTP请求共享一个连接池
+    """
+    print(f"\n[MAIN] 开始多线程爬取所有股票 ({len(STOCK_LIST)} 只, {max_workers}个工作线程)")
     start_time = time.time()
     
-    threads = []
+    scheduler = TaskScheduler(max_workers=max_workers)
+    fetcher = FetcherThread()
     try:
+        fetcher.start()
+        scheduler.start()
         for stock_code, stock_name in STOCK_LIST:
-            t = threading.Thread(
-                target=sentiment_pipeline_thread,
-                args=(stock_code, stock_name),
-                kwargs={'crawl_comment': crawl_comment, 'crawl_report': crawl_report, 'crawl_news': True, 'pages': pages}
-            )
-            threads.append(t)
-            t.start()
+            schedule_stock(scheduler, fetcher, stock_code, stock_name,
+                           crawl_comment=crawl_comment,
+                           crawl_report=crawl_report,
+                           crawl_news=crawl_news,
+                           pages=pages,
+                           post_backend=post_backend)
         
-        # 等待所有线程完成
-        for t in threads:
-            t.join()
+        # 等待所有任务完成
+        scheduler.join()
     
     except Exception as e:
         print(f"[MAIN] 异常: {str(e)}")
     
     finally:
+        scheduler.shutdown()
+        fetcher.close()
+        close_browser_pool()
         elapsed = time.time() - start_time
         print(f"\n[MAIN] 全部完成 - 总用时{elapsed:.2f}秒")
 
@@ -195,20 +387,40 @@ if __name__ == "__main__":
     CRAWL_COMMENTS = False      # 是否爬取评论
     CRAWL_REPORTS = True        # 是否下载研报
     CRAWL_NEWS = True           # 是否抓取资讯
+    EXTRACT_REPORTS = True      # 是否抽取研报PDF文本
+    EXPORT_PARQUET = True       # 是否增量导出Parquet快照
     PAGES = 2                    # 每个模块的爬取页数
+    POST_BACKEND_CHOICE = POST_BACKEND  # 发帖爬取后端："selenium" 或 "http"
     
     print(f"\n[CONFIG]")
     print(f"  - 多线程: {ENABLE_MULTITHREAD}")
     print(f"  - 爬取评论: {CRAWL_COMMENTS}")
     print(f"  - 下载研报: {CRAWL_REPORTS}")
+    print(f"  - 抓取资讯: {CRAWL_NEWS}")
+    print(f"  - 抽取研报文本: {EXTRACT_REPORTS}")
+    print(f"  - 导出Parquet: {EXPORT_PARQUET}")
     print(f"  - 页数: {PAGES}")
+    print(f"  - 发帖后端: {POST_BACKEND_CHOICE}")
     print(f"\n启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
     # 执行爬虫
     if ENABLE_MULTITHREAD:
-        run_all_stocks_multithread(crawl_comment=CRAWL_COMMENTS, crawl_report=CRAWL_REPORTS, pages=PAGES)
+        run_all_stocks_multithread(crawl_comment=CRAWL_COMMENTS, crawl_report=CRAWL_REPORTS, crawl_news=CRAWL_NEWS, pages=PAGES,
+                                   post_backend=POST_BACKEND_CHOICE)
     else:
-        run_all_stocks_sequential(crawl_comment=CRAWL_COMMENTS, crawl_report=CRAWL_REPORTS, pages=PAGES)
+        run_all_stocks_sequential(crawl_comment=CRAWL_COMMENTS, crawl_report=CRAWL_REPORTS, crawl_news=CRAWL_NEWS, pages=PAGES,
+                                  post_backend=POST_BACKEND_CHOICE)
+
+    # 抽取研报PDF文本（按内容哈希跳过已处理的文件）
+    if EXTRACT_REPORTS:
+        extract_reports(STOCK_LIST)
+
+    # 增量导出Parquet快照（按股票、日期分区）
+    if EXPORT_PARQUET:
+        from export import export_stocks  # pyarrow导入较慢，只在导出时加载
+        export_stocks(STOCK_LIST)
     
+    close_clients()
+    export_metrics()
     print(f"\n结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("\n爬虫执行完毕！")
@@ -0,0 +1,230 @@
+"""
+爬虫运行指标
+进程内的计数器与耗时直方图（按阶段/股票/数据源等标签区分），
+可导出为Prometheus文本格式或JSON文件，运行结束时打印汇总表
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 直方图桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram(object):
+    """固定桶直方图，记录各桶计数、总和与最大值"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为+Inf桶
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """由桶计数估计分位数（取所在桶上界，不超过最大值）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class MetricsRegistry(object):
+    """线程安全的指标注册表，指标由名称和标签唯一确定"""
+
+    def __init__(self):
+        self._counters = {}  # (name, label_key) -> float
+        self._histograms = {}  # (name, label_key) -> Histogram
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """with语句计时，结束时把耗时记入直方图（异常时同样记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.start_time = time.time()
+
+    def to_prometheus(self):
+        """导出为Prometheus文本格式"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+        lines = []
+        typed = set()
+        for (name, key), value in counters:
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{_format_labels(key)} {value}')
+        for (name, key), histogram in histograms:
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_format_labels(key, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(key)} {histogram.sum}')
+            lines.append(f'{name}_count{_format_labels(key)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+        return {
+            'start_time': self.start_time,
+            'end_time': time.time(),
+            'counters': [{'name': name, 'labels': dict(key), 'value': value} for (name, key), value in counters],
+            'histograms': [dict(histogram.to_dict(), name=name, labels=dict(key))
+                           for (name, key), histogram in histograms],
+        }
+
+    def export(self, path):
+        """按扩展名导出：.json为JSON，其余为Prometheus文本格式"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            else:
+                f.write(self.to_prometheus())
+        return path
+
+    def summary(self, group_by=('stage', 'source')):
+        """
+        汇总直方图：按group_by中的标签合并（其余标签如stock被折叠），
+        返回 [{'name', <group_by标签>, 'count', 'total', 'mean', 'p50', 'p95', 'max'}]
+        """
+        with self._lock:
+            items = list(self._histograms.items())
+        merged = {}
+        for (name, key), histogram in items:
+            labels = dict(key)
+            group = (name,) + tuple(labels.get(label, '') for label in group_by)
+            if group not in merged:
+                merged[group] = Histogram(histogram.buckets)
+            merged[group].merge(histogram)
+        rows = []
+        for group, histogram in sorted(merged.items()):
+            row = {'name': group[0]}
+            row.update(zip(group_by, group[1:]))
+            row.update({
+                'count': histogram.count,
+                'total': histogram.sum,
+                'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+                'max': histogram.max,
+            })
+            rows.append(row)
+        return rows
+
+    def counter_totals(self, collapse=('stock',)):
+        """合并计数器（collapse中的标签被折叠），返回 {(name, 其余标签): 总数}"""
+        with self._lock:
+            items = list(self._counters.items())
+        totals = {}
+        for (name, key), value in items:
+            group = (name, tuple((k, v) for k, v in key if k not in collapse))
+            totals[group] = totals.get(group, 0) + value
+        return totals
+
+    def print_summary(self, group_by=('stage', 'source')):
+        """打印各阶段耗时与计数器汇总表"""
+        elapsed = time.time() - self.start_time
+        print(f"\n[Metrics] 运行指标汇总（{elapsed:.1f}秒）")
+        print(f"{'指标':<26}" + ''.join(f"{label:<14}" for label in group_by) +
+              f"{'次数':>8}{'总计(s)':>10}{'平均(ms)':>10}{'P50(ms)':>10}{'P95(ms)':>10}{'最大(ms)':>10}")
+        for row in self.summary(group_by):
+            print(f"{row['name']:<26}" + ''.join(f"{row[label]:<14}" for label in group_by) +
+                  f"{row['count']:>8}{row['total']:>10.2f}{row['mean'] * 1000:>10.1f}"
+                  f"{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}{row['max'] * 1000:>10.1f}")
+        for (name, key), value in sorted(self.counter_totals().items()):
+            labels = ','.join(f'{k}={v}' for k, v in key)
+            rate = value / elapsed if elapsed else 0.0
+            print(f"{name:<26}{labels:<28}{value:>10.0f}  ({rate:.2f}/s)")
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """获取进程内共享的指标注册表"""
+    return _registry
+
+
+def inc(name, value=1, **labels):
+    _registry.inc(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+    _registry.observe(name, seconds, **labels)
+
+
+def timer(name, **labels):
+    return _registry.timer(name, **labels)
@@ -1,4 +1,86 @@
-from pymongo import MongoClient
+import hashlib
+import re
+import threading
+import time
+
+from pymongo import MongoClient, InsertOne, UpdateOne, UpdateMany
+from pymongo.errors import BulkWriteError
+
+import metrics
+
+from config import (MONGO_BATCH_SIZE, MONGO_FLUSH_INTERVAL, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+                    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS)
+
+
+# 按集合名前缀声明的索引，集合在进程内首次使用时创建
+COLLECTION_INDEXES = {
+    'post_': [[('post_date', 1), ('post_time', 1)], [('rollup_time', 1)], [('kw_day', 1)]],
+    'comment_': [[('post_id', 1)]],
+    'news_': [[('news_date', 1)]],
+    'report_': [[('download_time', 1)], [('sha256', 1)]],
+    'report_text_': [[('files.path', 1)]],
+    'sentiment_rollup_': [[('granularity', 1), ('bucket_start', 1)]],
+}
+
+_indexed_collections = set()
+_indexed_lock = threading.Lock()
+
+# 每只股票的数据版本号：该股票的集合有新写入时递增，查询服务据此使响应缓存失效
+INGEST_VERSION_COLLECTION = 'ingest_version'
+_STOCK_SUFFIX = re.compile(r'_(\d{6})$')
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host='localhost', port=27017):
+    """获取进程内共享的MongoClient，同一host:port复用一个连接池"""
+    key = (host, port)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = MongoClient(
+                host=host,
+                port=port,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            )
+            _clients[key] = client
+        return client
+
+
+def close_clients():
+    """关闭所有共享的MongoClient（进程退出前调用）"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+def bump_ingest_version(database, collection_name):
+    """集合名以股票代码结尾时递增该股票的数据版本号"""
+    match = _STOCK_SUFFIX.search(collection_name)
+    if match is None:
+        return
+    try:
+        database[INGEST_VERSION_COLLECTION].update_one(
+            {'_id': match.group(1)},
+            {'$inc': {'version': 1}, '$set': {'updated_at': time.time()}},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"[MongoAPI] 更新数据版本失败 {collection_name}: {str(e)}")
+
+
+def make_doc_id(*parts):
+    """由自然键字段生成确定性的文档_id，重复爬取时可幂等upsert"""
+    key = '\x1f'.join('' if part is None else str(part).strip() for part in parts)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
 
 class MongoAPI(object):
@@ -8,15 +90,39 @@ class MongoAPI(object):
         self.port = port
         self.db_name = db_name
         self.collection = collection_name
-        self.client = MongoClient(host=self.host, port=self.port)
+        self.client = get_client(self.host, self.port)
         self.database = self.client[self.db_name]
         self.collection = self.database[self.collection]
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        key = (self.host, self.port, self.db_name, self.collection.name)
+        with _indexed_lock:
+            if key in _indexed_collections:
+                return
+            _indexed_collections.add(key)
+        for prefix, indexes in COLLECTION_INDEXES.items():
+            if self.collection.name.startswith(prefix):
+                for keys in indexes:
+                    try:
+                        self.collection.create_index(keys, background=True)
+                    except Exception as e:
+                        print(f"[MongoAPI] 创建索引失败 {self.collection.name} {keys}: {str(e)}")
 
     def insert_one(self, kv_dict):
-        self.collection.insert_one(kv_dict)
+        with metrics.timer('mongo_write_seconds', collection=self.collection.name):
+            self.collection.insert_one(kv_dict)
+        metrics.inc('mongo_docs_written_total', collection=self.collection.name)
+        bump_ingest_version(self.database, self.collection.name)
 
     def insert_many(self, li_dict):  # more efficient
-        self.collection.insert_many(li_dict)
+        with metrics.timer('mongo_write_seconds', collection=self.collection.name):
+            self.collection.insert_many(li_dict)
+        metrics.inc('mongo_docs_written_total', len(li_dict), collection=self.collection.name)
+        bump_ingest_version(self.database, self.collection.name)
+
+    def bulk_writer(self, batch_size=MONGO_BATCH_SIZE, flush_interval=MONGO_FLUSH_INTERVAL):
+        return BulkWriter(self, batch_size=batch_size, flush_interval=flush_interval)
 
     def find_one(self, query1, query2):
         return self.collection.find_one(query1, query2)
@@ -34,7 +140,103 @@ class MongoAPI(object):
         return self.collection.count_documents({})
 
     def update_one(self, kv_dict):
-        self.collection.update_one(kv_dict, {'$set': kv_dict}, upsert=True)
+        with metrics.timer('mongo_write_seconds', collection=self.collection.name):
+            self.collection.update_one(kv_dict, {'$set': kv_dict}, upsert=True)
+        metrics.inc('mongo_docs_written_total', collection=self.collection.name)
+        bump_ingest_version(self.database, self.collection.name)
 
     def drop(self):
         self.collection.drop()
+
+
+class BulkWriter(object):
+    """
+    缓冲写入器：累积文档，达到数量或时间阈值时用无序bulk_write批量写入
+    时间阈值只在缓冲新操作时检查，没有新操作的写入器不会自行写入，需调用flush()或close()
+    """
+
+    def __init__(self, mongo: MongoAPI, batch_size=MONGO_BATCH_SIZE, flush_interval=MONGO_FLUSH_INTERVAL):
+        self.mongo = mongo
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.total_docs = 0
+        self.total_flushes = 0
+        self.total_seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, kv_dict):
+        self._append(InsertOne(kv_dict))
+
+    def upsert(self, kv_dict):
+        """按_id幂等写入：已存在则更新字段，不存在则插入"""
+        fields = {k: v for k, v in kv_dict.items() if k != '_id'}
+        self._append(UpdateOne({'_id': kv_dict['_id']}, {'$set': fields}, upsert=True))
+
+    def update(self, query, update, upsert=False):
+        """缓冲任意更新操作（如$inc累加）"""
+        self._append(UpdateOne(query, update, upsert=upsert))
+
+    def update_many(self, query, update):
+        """缓冲更新所有匹配的文档（如按sha256回填多条研报记录）"""
+        self._append(UpdateMany(query, update))
+
+    def _append(self, op):
+        with self._lock:
+            self._buffer.append(op)
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            ops, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not ops:
+            return 0
+
+        start = time.perf_counter()
+        try:
+            result = self.mongo.collection.bulk_write(ops, ordered=False)
+            written = result.inserted_count + result.upserted_count + result.modified_count
+        except BulkWriteError as e:
+            details = e.details
+            written = details.get('nInserted', 0) + details.get('nUpserted', 0) + details.get('nModified', 0)
+            print(f"[BulkWriter] {self.mongo.collection.name} 部分写入失败: {len(details.get('writeErrors', []))}条")
+        except Exception:
+            # 连接中断、超时等整批未写入：放回缓冲区开头，下次flush重试
+            with self._lock:
+                self._buffer[:0] = ops
+            raise
+        elapsed = time.perf_counter() - start
+        metrics.observe('mongo_write_seconds', elapsed, collection=self.mongo.collection.name)
+        metrics.inc('mongo_docs_written_total', written, collection=self.mongo.collection.name)
+
+        if written:
+            bump_ingest_version(self.mongo.database, self.mongo.collection.name)
+        self.total_docs += written
+        self.total_flushes += 1
+        self.total_seconds += elapsed
+        print(f"[BulkWriter] {self.mongo.collection.name} 写入{written}/{len(ops)}条, "
+              f"用时{elapsed * 1000:.1f}ms, {written / max(elapsed, 1e-9):.0f} docs/s")
+        return written
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        return {
+            'collection': self.mongo.collection.name,
+            'docs': self.total_docs,
+            'flushes': self.total_flushes,
+            'seconds': self.total_seconds,
+            'docs_per_sec': self.total_docs / self.total_seconds if self.total_seconds else 0.0,
+        }
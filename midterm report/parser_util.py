@@ -1,9 +1,99 @@
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import html
+import json
 import re
 
+from lxml import etree, html as lxml_html
+
+from config import URL_TEMPLATES
+
+# 逐元素解析（PARSE_MODE="element"）用到的selenium在对应方法内导入
+
+
+def _has_class(name):
+    """XPath条件：元素class中包含指定类名（等价于CSS的 .name）"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _node_text(nodes):
+    """取第一个节点的可见文本（合并空白），与Selenium的element.text一致"""
+    if not nodes:
+        return None
+    node = nodes[0]
+    if isinstance(node, str):  # 属性值（如@href）
+        return node.strip()
+    return ' '.join(node.text_content().split())
+
+
+def _parse_rows(page_source, row_xpath, field_xpaths):
+    """一次解析page_source，按行提取字段；缺少任一字段的行跳过"""
+    if not page_source:
+        return []
+    root = lxml_html.fromstring(page_source)
+    results = []
+    for row in row_xpath(root):
+        info = {}
+        for field, xpath in field_xpaths.items():
+            value = _node_text(xpath(row))
+            if value is None:
+                info = None
+                break
+            info[field] = value
+        if info:
+            results.append(info)
+    return results
+
+
+# 帖子链接中的帖子ID，如 /news,600036,1234567890.html
+_POST_ID_PATTERN = re.compile(r'news,[^,/]+,(\d+)')
+
+# 股吧列表页内嵌的帖子数据：var article_list = {"re": [...], ...};
+_ARTICLE_LIST_PATTERN = re.compile(r'var\s+article_list\s*=\s*')
+_JSON_DECODER = json.JSONDecoder()
+
+# 预编译的XPath（对应原CSS选择器）
+_POST_ROW = etree.XPath('//table//tbody/tr')
+_POST_FIELDS = {
+    'post_title': etree.XPath(f".//*[{_has_class('l3')}]//a"),
+    'post_url': etree.XPath(f".//*[{_has_class('l3')}]//a/@href"),
+    'post_author': etree.XPath(f".//*[{_has_class('l4')}]//a"),
+    'post_date': etree.XPath(f".//*[{_has_class('l5')}]"),
+    'post_time': etree.XPath(f".//*[{_has_class('l6')}]"),
+    'post_reply': etree.XPath(f".//*[{_has_class('l7')}]//span"),
+    'post_like': etree.XPath(f".//*[{_has_class('l8')}]//span"),
+}
+
+_COMMENT_ROW = etree.XPath(f"//*[{_has_class('article-item')}]")
+_COMMENT_FIELDS = {
+    'comment_author': etree.XPath(f".//*[{_has_class('user_name')}]//a"),
+    'comment_content': etree.XPath(f".//*[{_has_class('t_content')}]"),
+    'comment_time': etree.XPath(f".//*[{_has_class('pub_time')}]"),
+    'comment_like': etree.XPath(f".//*[{_has_class('zan')}]//b"),
+}
+
+# 研报PDF链接：链接字符不含空白、引号和尖括号，回溯不会越过当前链接
+_PDF_URL_PATTERN = re.compile(r'https?://[^\s"\'<>]+\.[pP][dD][fF]')
+
+# 资讯检索结果：标题链接在.news_item_t中，时间形如"2025-11-16 10:00:00 - "，来源在.news_item_source中
+# 单个预编译扫描器（以公共前缀news_item_快速定位）按出现顺序匹配标题、时间、来源三类片段，一次扫描整页
+_NEWS_TOKEN_PATTERN = re.compile(
+    r'news_item_(?:'
+    r't\b[^>]*>\s*<a[^>]*?href="(?P<url>[^"]*)"[^>]*>(?P<title>.*?)</a>'
+    r'|time\b[^>]*>\s*(?P<date>\d{4}-\d{2}-\d{2})(?:\s+(?P<time>\d{2}:\d{2}(?::\d{2})?))?'
+    r'|source\b[^>]*>(?P<source>.*?)</'
+    r')',
+    re.DOTALL
+)
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# 不含上述结构的页面退回按<li>解析
+_NEWS_ITEM = etree.XPath('//li')
+_NEWS_ANY_LINK = etree.XPath('.//a')
+_NEWS_TIME_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})(?:\s+(\d{2}:\d{2}(?::\d{2})?))?')
+_NEWS_SOURCE = etree.XPath(f".//*[{_has_class('news_item_source')}]")
+_NEWS_SOURCE_PATTERN = re.compile(r'来源\s*[:：]\s*([^\s|<]+)')
+_SOURCE_PREFIX_PATTERN = re.compile(r'^来源\s*[:：]\s*')
+
 
 class PostParser:
     """股吧发帖解析器"""
@@ -11,6 +101,9 @@ class PostParser:
     @staticmethod
     def parse_post(element):
         """解析单条发帖信息"""
+        from selenium.common.exceptions import NoSuchElementException
+        from selenium.webdriver.common.by import By
+
         try:
             post_info = {
                 'post_title': element.find_element(By.CSS_SELECTOR, '.l3 a').text,
@@ -19,11 +112,61 @@ class PostParser:
                 'post_time': element.find_element(By.CSS_SELECTOR, '.l6').text,
                 'post_reply': element.find_element(By.CSS_SELECTOR, '.l7 span').text,
                 'post_like': element.find_element(By.CSS_SELECTOR, '.l8 span').text,
+                'post_url': element.find_element(By.CSS_SELECTOR, '.l3 a').get_attribute('href') or '',
             }
+            post_info['post_id'] = PostParser.extract_post_id(post_info['post_url'])
             return post_info
         except NoSuchElementException:
             return None
 
+    @staticmethod
+    def parse_post_list(page_source):
+        """从整页HTML一次性解析全部发帖（避免逐元素WebDriver调用）"""
+        posts = _parse_rows(page_source, _POST_ROW, _POST_FIELDS)
+        for post_info in posts:
+            post_info['post_id'] = PostParser.extract_post_id(post_info['post_url'])
+        return posts
+
+    @staticmethod
+    def parse_post_json(html_text, stock_code):
+        """解析股吧列表页内嵌的article_list数据（HTTP后端），返回与parse_post相同字段的字典"""
+        match = _ARTICLE_LIST_PATTERN.search(html_text or '')
+        if not match:
+            return []
+        try:
+            data, _ = _JSON_DECODER.raw_decode(html_text, match.end())
+        except ValueError:
+            return []
+
+        posts = []
+        for item in data.get('re') or []:
+            post_id = item.get('post_id')
+            title = item.get('post_title')
+            if post_id is None or not title:
+                continue
+            # 时间格式：2024-12-05 10:11:12
+            publish_time = item.get('post_publish_time') or item.get('post_last_time') or ''
+            date_part, _, time_part = publish_time.partition(' ')
+            post_id = str(post_id)
+            posts.append({
+                'post_title': title.strip(),
+                'post_author': item.get('user_nickname', ''),
+                'post_date': date_part,
+                'post_time': time_part[:5],
+                'post_reply': str(item.get('post_comment_count', 0)),
+                'post_like': str(item.get('post_like_count', 0)),
+                'post_click': str(item.get('post_click_count', 0)),
+                'post_url': URL_TEMPLATES['post'].format(stock_code=stock_code, post_id=post_id),
+                'post_id': post_id,
+            })
+        return posts
+
+    @staticmethod
+    def extract_post_id(post_url):
+        """从帖子链接中提取帖子ID，无法识别时返回None"""
+        match = _POST_ID_PATTERN.search(post_url or '')
+        return match.group(1) if match else None
+
 
 class CommentParser:
     """股吧评论解析器"""
@@ -31,6 +174,9 @@ class CommentParser:
     @staticmethod
     def parse_comment(element):
         """解析单条评论信息"""
+        from selenium.common.exceptions import NoSuchElementException
+        from selenium.webdriver.common.by import By
+
         try:
             comment_info = {
                 'comment_author': element.find_element(By.CSS_SELECTOR, '.user_name a').text,
@@ -42,6 +188,11 @@ class CommentParser:
         except NoSuchElementException:
             return None
 
+    @staticmethod
+    def parse_comment_list(page_source):
+        """从整页HTML一次性解析全部评论"""
+        return _parse_rows(page_source, _COMMENT_ROW, _COMMENT_FIELDS)
+
 
 class ReportParser:
     """研报PDF解析器"""
@@ -49,6 +200,9 @@ class ReportParser:
     @staticmethod
     def parse_report(element):
         """解析研报页面元素（用于提取PDF下载链接）"""
+        from selenium.common.exceptions import NoSuchElementException
+        from selenium.webdriver.common.by import By
+
         try:
             report_info = {
                 'report_title': element.find_element(By.CSS_SELECTOR, '.title a').text,
@@ -62,10 +216,8 @@ class ReportParser:
     
     @staticmethod
     def extract_pdf_url(html_text):
-        """从HTML中使用正则表达式提取PDF下载链接"""
-        pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+\.pdf'
-        urls = re.findall(pattern, html_text)
-        return urls if urls else []
+        """从HTML中提取PDF下载链接（按出现顺序去重）"""
+        return list(dict.fromkeys(_PDF_URL_PATTERN.findall(html_text or '')))
 
 
 class NewsParser:
@@ -73,24 +225,79 @@ class NewsParser:
     
     @staticmethod
     def parse_news_from_html(html_text):
-        """解析新闻列表HTML"""
+        """
+        一次扫描资讯检索结果页，返回 news_title / news_url / news_date / news_time / news_source
+        标题中的<em>高亮标签只保留文字；没有标题链接或日期的条目跳过，没有来源的条目news_source为None
+        """
+        if not html_text:
+            return []
+        news_list = []
+        pending = None  # 已匹配标题、尚未匹配时间的条目
+        source = None  # 当前条目在时间之前出现的来源
+        record = None  # 当前条目已生成的记录（来源可能在时间之后出现）
+        for match in _NEWS_TOKEN_PATTERN.finditer(html_text):
+            if match.group('title') is not None:
+                pending, source, record = match, None, None
+                continue
+            if match.group('source') is not None:
+                if record is not None and record['news_source'] is None:
+                    record['news_source'] = NewsParser._clean_source(match.group('source'))
+                elif pending is not None:
+                    source = NewsParser._clean_source(match.group('source'))
+                continue
+            if pending is None:
+                continue
+            title = html.unescape(_WHITESPACE_PATTERN.sub(' ', _TAG_PATTERN.sub('', pending.group('title'))))
+            record = NewsParser._news_record(
+                title, html.unescape(pending.group('url')), match.group('date'), match.group('time'), source)
+            news_list.append(record)
+            pending = None
+        if news_list:
+            return news_list
+        return NewsParser._parse_news_items(html_text)
+
+    @staticmethod
+    def _clean_source(text):
+        """来源片段去掉标签和“来源：”前缀，为空时返回None"""
+        text = html.unescape(_WHITESPACE_PATTERN.sub(' ', _TAG_PATTERN.sub('', text))).strip()
+        text = _SOURCE_PREFIX_PATTERN.sub('', text)
+        return text or None
+
+    @staticmethod
+    def _news_record(title, url, news_date, news_time, news_source=None):
+        url = url.strip()
+        return {
+            'news_title': title.strip(),
+            'news_url': url,
+            'news_date': news_date,
+            'news_time': news_time or '',
+            'news_source': news_source,
+        }
+
+    @staticmethod
+    def _parse_news_items(html_text):
+        """按<li>逐条解析（页面结构与检索结果页不同时使用）"""
         news_list = []
         try:
-            # 使用正则表达式提取新闻项
-            pattern = r'<li>(.*?)</li>'
-            items = re.findall(pattern, html_text, re.DOTALL)
-            
-            for item in items:
-                title_match = re.search(r'>([^<]+)</a>', item)
-                time_match = re.search(r'(\d{4}-\d{2}-\d{2})', item)
-                
-                if title_match and time_match:
-                    news_info = {
-                        'news_title': title_match.group(1),
-                        'news_date': time_match.group(1)
-                    }
-                    news_list.append(news_info)
-        except Exception as e:
+            root = lxml_html.fromstring(html_text)
+        except (etree.ParserError, ValueError) as e:
             print(f"解析新闻异常: {str(e)}")
-        
+            return news_list
+
+        for item in _NEWS_ITEM(root):
+            links = _NEWS_ANY_LINK(item)
+            time_match = _NEWS_TIME_PATTERN.search(item.text_content())
+            if not links or not time_match:
+                continue
+            title = ' '.join(links[0].text_content().split())
+            if not title:
+                continue
+            source_nodes = _NEWS_SOURCE(item)
+            if source_nodes:
+                source = NewsParser._clean_source(source_nodes[0].text_content())
+            else:
+                source_match = _NEWS_SOURCE_PATTERN.search(item.text_content())
+                source = source_match.group(1) if source_match else None
+            news_list.append(NewsParser._news_record(
+                title, links[0].get('href') or '', time_match.group(1), time_match.group(2), source))
         return news_list
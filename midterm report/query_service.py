@@ -0,0 +1,309 @@
+"""
+查询服务
+为小程序提供发帖、资讯、研报、情感序列和关键词的只读REST接口（Flask）：
+列表接口使用游标分页和字段投影；响应按(路径, 参数, 股票数据版本)缓存（TTL + LRU），
+入库写入会递增股票的数据版本号使缓存失效；响应带ETag，客户端重复请求时返回304
+
+本地运行：python query_service.py
+使用mongomock测试：先执行 mongodb._clients[('localhost', 27017)] = mongomock.MongoClient()，
+再用 create_app().test_client() 发请求
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import Flask, Response, request
+
+from config import (STOCK_LIST, API_HOST, API_PORT, API_CACHE_TTL, API_CACHE_SIZE, API_VERSION_POLL, API_PAGE_SIZE,
+                    API_MAX_PAGE_SIZE)
+from dedup import NOT_DUPLICATE
+from keyword_store import KeywordStore
+from mongodb import get_client, INGEST_VERSION_COLLECTION
+from sentiment_rollup import SentimentRollup, GRANULARITIES
+
+# 列表资源 -> (集合名前缀, 排序日期字段, 可投影字段, 默认字段)
+RESOURCES = {
+    'posts': ('post_', 'post_date',
+              ('post_title', 'post_author', 'post_date', 'post_time', 'post_reply', 'post_like', 'post_click',
+               'post_url', 'pos_p', 'topic', 'dup_of'),
+              ('post_title', 'post_author', 'post_date', 'post_time', 'post_reply', 'post_like', 'pos_p')),
+    'news': ('news_', 'news_date',
+             ('news_title', 'news_url', 'news_date', 'news_time', 'news_source', 'dup_of'),
+             ('news_title', 'news_url', 'news_date', 'news_time', 'news_source')),
+    'reports': ('report_', 'download_time',
+                ('report_title', 'report_url', 'download_time', 'file_size', 'rating', 'target_price', 'page_count'),
+                ('report_title', 'report_url', 'download_time', 'rating', 'target_price')),
+}
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseCache(object):
+    """线程安全的TTL + LRU响应缓存，值为 (ETag, 响应体)"""
+
+    def __init__(self, ttl=API_CACHE_TTL, max_entries=API_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (过期时间, etag, body)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, etag, body):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {'size': size, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
+
+
+class IngestVersions(object):
+    """各股票的数据版本号（入库时由mongodb.bump_ingest_version递增），最多每poll_interval秒读取一次"""
+
+    def __init__(self, database, poll_interval=API_VERSION_POLL):
+        self.database = database
+        self.poll_interval = poll_interval
+        self._versions = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, stock_code):
+        with self._lock:
+            if time.monotonic() - self._loaded_at >= self.poll_interval:
+                self._versions = {doc['_id']: doc.get('version', 0)
+                                  for doc in self.database[INGEST_VERSION_COLLECTION].find({}, {'version': 1})}
+                self._loaded_at = time.monotonic()
+            return self._versions.get(stock_code, 0)
+
+
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """还原encode_cursor生成的 [排序日期, _id]，格式不符时返回400"""
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise ApiError("无效的cursor")
+    if not isinstance(value, list) or len(value) != 2:
+        raise ApiError("无效的cursor")
+    return value
+
+
+def _parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ApiError(f"{name}应为YYYY-MM-DD格式")
+
+
+def _int_arg(args, name, default, minimum=1, maximum=None):
+    try:
+        value = int(args.get(name, default))
+    except ValueError:
+        raise ApiError(f"{name}应为整数")
+    value = max(minimum, value)
+    return min(value, maximum) if maximum is not None else value
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class QueryService(object):
+    """接口实现：每个方法返回可序列化为JSON的数据，缓存与ETag由create_app统一处理"""
+
+    def __init__(self, db_name='stock_sentiment'):
+        self.db_name = db_name
+        self.database = get_client()[db_name]
+        self.stock_names = dict(STOCK_LIST)
+
+    def _check_stock(self, stock_code):
+        if stock_code not in self.stock_names:
+            raise ApiError(f"未知股票代码: {stock_code}", 404)
+
+    def stocks(self):
+        return {'stocks': [{'stock_code': code, 'stock_name': name} for code, name in STOCK_LIST]}
+
+    def list_items(self, resource, stock_code, args):
+        """
+        游标分页：按(日期字段, _id)倒序，cursor为上一页最后一条的排序键
+        参数：limit, cursor, fields（逗号分隔）, start/end（日期，含两端）, include_dups
+        """
+        self._check_stock(stock_code)
+        prefix, date_field, allowed, default = RESOURCES[resource]
+        limit = _int_arg(args, 'limit', API_PAGE_SIZE, maximum=API_MAX_PAGE_SIZE)
+        fields = [f for f in args.get('fields', '').split(',') if f] or list(default)
+        unknown = [f for f in fields if f not in allowed]
+        if unknown:
+            raise ApiError(f"不支持的字段: {','.join(unknown)}")
+
+        conditions = []
+        if resource != 'reports' and args.get('include_dups') != '1':
+            conditions.append(NOT_DUPLICATE)
+        start, end = args.get('start'), args.get('end')
+        _parse_date(start, 'start')
+        _parse_date(end, 'end')
+        if start:
+            conditions.append({date_field: {'$gte': start}})
+        if end:
+            conditions.append({date_field: {'$lte': end + '\uffff'}})  # 含end当天（兼容带时间的日期字段）
+        if args.get('cursor'):
+            last_date, last_id = decode_cursor(args['cursor'])
+            conditions.append({'$or': [{date_field: {'$lt': last_date}},
+                                       {date_field: last_date, '_id': {'$lt': last_id}}]})
+        query = {'$and': conditions} if conditions else {}
+
+        projection = dict.fromkeys(fields + [date_field], 1)
+        docs = list(self.database[f'{prefix}{stock_code}'].find(query, projection)
+                    .sort([(date_field, -1), ('_id', -1)]).limit(limit + 1))
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        next_cursor = encode_cursor([docs[-1].get(date_field), docs[-1]['_id']]) if has_more else None
+        items = [dict({'id': doc['_id']}, **{f: doc.get(f) for f in fields}) for doc in docs]
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def sentiment(self, stock_code, args):
+        """情感时间序列：granularity（15min/1h/1d）, start/end（日期，含两端）"""
+        self._check_stock(stock_code)
+        granularity = args.get('granularity', '1d')
+        if granularity not in GRANULARITIES:
+            raise ApiError(f"granularity应为{'/'.join(GRANULARITIES)}之一")
+        start = _parse_date(args.get('start'), 'start')
+        end = _parse_date(args.get('end'), 'end')
+        series = SentimentRollup(stock_code, self.db_name).get_series(
+            granularity, start, end + timedelta(days=1) if end else None)
+        return {'stock_code': stock_code, 'granularity': granularity, 'series': series}
+
+    def keywords(self, stock_code, args):
+        """最近days天的Top-K关键词"""
+        self._check_stock(stock_code)
+        days = _int_arg(args, 'days', 7, maximum=365)
+        k = _int_arg(args, 'k', 50, maximum=200)
+        words = KeywordStore(stock_code, self.db_name).top_keywords_last_days(days=days, k=k)
+        return {'stock_code': stock_code, 'days': days, 'keywords': [{'word': w, 'count': n} for w, n in words]}
+
+    def hot(self, args):
+        """首页热度：各股票最近days天的发帖量与平均情感，按发帖量倒序"""
+        days = _int_arg(args, 'days', 3, maximum=30)
+        start = datetime.combine(datetime.now().date() - timedelta(days=days - 1), datetime.min.time())
+        rows = []
+        for stock_code, stock_name in STOCK_LIST:
+            series = SentimentRollup(stock_code, self.db_name).get_series('1d', start)
+            count = sum(point['count'] for point in series)
+            total = sum(point['mean'] * point['count'] for point in series if point['mean'] is not None)
+            rows.append({
+                'stock_code': stock_code,
+                'stock_name': stock_name,
+                'post_count': count,
+                'mean_sentiment': total / count if count else None,
+                'series': [{'time': point['time'], 'mean': point['mean'], 'count': point['count']}
+                           for point in series],
+            })
+        rows.sort(key=lambda row: row['post_count'], reverse=True)
+        return {'days': days, 'stocks': rows}
+
+
+def create_app(db_name='stock_sentiment', cache=None):
+    """创建Flask应用（cache可传入自定义的ResponseCache）"""
+    app = Flask(__name__)
+    service = QueryService(db_name)
+    cache = cache or ResponseCache()
+    versions = IngestVersions(service.database)
+    app.config['RESPONSE_CACHE'] = cache
+
+    def respond(stock_codes, build):
+        """按(路径, 参数, 相关股票的数据版本)缓存响应体，并处理If-None-Match"""
+        key = (request.path, tuple(sorted(request.args.items(multi=True))),
+               tuple(versions.get(code) for code in stock_codes))
+        cached = cache.get(key)
+        if cached is None:
+            body = json.dumps(build(), ensure_ascii=False, default=_json_default).encode('utf-8')
+            etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+            cache.put(key, etag, body)
+        else:
+            etag, body = cached
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'  # 客户端每次用ETag校验
+        return response
+
+    @app.errorhandler(ApiError)
+    def handle_api_error(error):
+        body = json.dumps({'error': str(error)}, ensure_ascii=False).encode('utf-8')
+        return Response(body, status=error.status, mimetype='application/json')
+
+    @app.route('/api/stocks')
+    def stocks():
+        return respond((), service.stocks)
+
+    @app.route('/api/hot')
+    def hot():
+        return respond([code for code, _ in STOCK_LIST], lambda: service.hot(request.args))
+
+    @app.route('/api/stocks/<stock_code>/<resource>')
+    def list_items(stock_code, resource):
+        if resource not in RESOURCES:
+            raise ApiError(f"未知资源: {resource}", 404)
+        return respond((stock_code,), lambda: service.list_items(resource, stock_code, request.args))
+
+    @app.route('/api/stocks/<stock_code>/sentiment')
+    def sentiment(stock_code):
+        return respond((stock_code,), lambda: service.sentiment(stock_code, request.args))
+
+    @app.route('/api/stocks/<stock_code>/keywords')
+    def keywords(stock_code):
+        return respond((stock_code,), lambda: service.keywords(stock_code, request.args))
+
+    @app.route('/api/cache')
+    def cache_stats():
+        return Response(json.dumps(cache.stats()), mimetype='application/json')
+
+    return app
+
+
+if __name__ == '__main__':
+    create_app().run(host=API_HOST, port=API_PORT, threaded=True)
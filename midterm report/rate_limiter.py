@@ -0,0 +1,180 @@
+"""
+自适应限速器
+每个主机一个令牌桶，按响应结果调整速率（加性增、乘性减）：
+正常且响应快时逐步提速，响应变慢时小幅降速，遇到429/403/503或验证页时减半并暂停一段时间
+"""
+
+import asyncio
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from config import (RATE_LIMIT_INITIAL, RATE_LIMIT_MIN, RATE_LIMIT_MAX, RATE_LIMIT_BURST, RATE_LIMIT_INCREASE,
+                    RATE_LIMIT_TARGET_LATENCY, RATE_LIMIT_PENALTY, RATE_LIMIT_CAPTCHA_MARKERS,
+                    RATE_LIMIT_CAPTCHA_MAX_BODY)
+
+THROTTLE_STATUS = frozenset((403, 429, 503))
+_MAX_PENALTY = 300  # 单次暂停时长上限（秒）
+_TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+
+
+def is_captcha_page(text):
+    """
+    页面是否为反爬验证页：只检查<title>，没有<title>的短页面检查全文
+    （正文中提到“验证码”的发帖、评论、资讯页面不算验证页）
+    """
+    if not text:
+        return False
+    match = _TITLE_PATTERN.search(text)
+    if match:
+        text = match.group(1)
+    elif len(text) > RATE_LIMIT_CAPTCHA_MAX_BODY:
+        return False
+    return any(marker in text for marker in RATE_LIMIT_CAPTCHA_MARKERS)
+
+
+class HostLimiter(object):
+    """单个主机的令牌桶 + AIMD速率调整"""
+
+    def __init__(self, host, rate=RATE_LIMIT_INITIAL, burst=RATE_LIMIT_BURST, max_rate=RATE_LIMIT_MAX):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max_rate
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._strikes = 0  # 连续被限流次数
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def reserve(self):
+        """
+        预占一个令牌，返回需要等待的秒数（调用方负责等待）
+        暂停期间_updated位于未来、不补充令牌，暂停结束后排队的请求按1/rate依次放行
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._updated)
+            self.tokens = min(self.burst, self.tokens + (start - self._updated) * self.rate)
+            self._updated = start
+            self.tokens -= 1
+            self.requests += 1
+            delay = (start - now) + (-self.tokens / self.rate if self.tokens < 0 else 0.0)
+            return max(delay, self._blocked_until - now)
+
+    def on_success(self, latency=None):
+        with self._lock:
+            self._strikes = 0
+            if latency is not None and latency > RATE_LIMIT_TARGET_LATENCY:
+                self.rate = max(RATE_LIMIT_MIN, self.rate * 0.9)
+            else:
+                self.rate = min(self.max_rate, self.rate + RATE_LIMIT_INCREASE)
+
+    def on_error(self):
+        """网络异常或非限流类的错误状态码"""
+        with self._lock:
+            self.errors += 1
+            self.rate = max(RATE_LIMIT_MIN, self.rate * 0.7)
+
+    def on_throttle(self):
+        """被限流或出现验证页：速率减半，清空令牌并暂停该主机"""
+        with self._lock:
+            self.throttled += 1
+            self._strikes += 1
+            self.rate = max(RATE_LIMIT_MIN, self.rate * 0.5)
+            penalty = min(_MAX_PENALTY, RATE_LIMIT_PENALTY * 2 ** (self._strikes - 1))
+            self._blocked_until = time.monotonic() + penalty
+            # 暂停期间不累积令牌，避免暂停结束时突发
+            self.tokens = 0.0
+            self._updated = self._blocked_until
+            print(f"[RateLimiter] {self.host} 触发反爬，暂停{penalty}秒，速率降至{self.rate:.2f}次/秒")
+
+
+class RateLimiter(object):
+    """按主机管理令牌桶，同步代码、协程和Selenium页面加载共用同一份速率状态"""
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def host_limiter(self, url):
+        host = urlsplit(url).netloc or url
+        with self._lock:
+            limiter = self._hosts.get(host)
+            if limiter is None:
+                limiter = HostLimiter(host)
+                self._hosts[host] = limiter
+            return limiter
+
+    def configure(self, url, rate=None, burst=None, max_rate=None):
+        """为url所在主机单独设置速率、令牌桶容量和速率上限（如本地测试服务器不限速）"""
+        limiter = self.host_limiter(url)
+        with limiter._lock:
+            if max_rate is not None:
+                limiter.max_rate = max_rate
+            if rate is not None:
+                limiter.rate = rate
+            if burst is not None:
+                limiter.burst = burst
+                limiter.tokens = float(burst)
+        return limiter
+
+    def acquire(self, url):
+        """阻塞直到允许向url所在主机发出请求，返回等待秒数"""
+        delay = self.host_limiter(url).reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, url):
+        """acquire的协程版本，等待期间不阻塞事件循环"""
+        delay = self.host_limiter(url).reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def feedback(self, url, status=None, latency=None, text=None, error=False):
+        """
+        上报一次请求结果，返回True表示被限流或拦截（调用方应视为失败并重试）
+        status: HTTP状态码（Selenium页面加载不提供）；latency: 响应耗时（秒）；text: 页面内容，用于识别验证页
+        """
+        limiter = self.host_limiter(url)
+        if status in THROTTLE_STATUS or is_captcha_page(text):
+            limiter.on_throttle()
+            return True
+        if error or (status is not None and status >= 500):
+            limiter.on_error()
+        elif status is None or status < 400:
+            limiter.on_success(latency)
+        return False
+
+    def stats(self):
+        """各主机当前速率与累计计数"""
+        with self._lock:
+            hosts = list(self._hosts.values())
+        return {
+            limiter.host: {
+                'rate': limiter.rate,
+                'requests': limiter.requests,
+                'throttled': limiter.throttled,
+                'errors': limiter.errors,
+            }
+            for limiter in hosts
+        }
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """获取进程内共享的限速器"""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
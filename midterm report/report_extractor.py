@@ -0,0 +1,226 @@
+"""
+研报PDF文本抽取
+遍历研报目录，按内容哈希跳过已处理的文件，在进程池中并行解析PDF，
+逐页文本及评级、目标价写入 report_text_{stock_code}（_id为文件SHA-256），
+并回填到 report_{stock_code} 中sha256相同的研报记录
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import metrics
+from config import (STOCK_LIST, REPORT_PDF_DIR, REPORT_EXTRACT_WORKERS, REPORT_EXTRACT_MAX_PAGES,
+                    REPORT_RATING_PAGES)
+from mongodb import MongoAPI
+from utils import sha256_of_file
+
+# 研报评级用语（长词在前，避免“推荐”先于“强烈推荐”匹配）
+RATINGS = ('强烈推荐', '谨慎推荐', '审慎推荐', '推荐', '买入', '增持', '优于大市', '强于大市', '跑赢行业', '跑赢大市',
+           '中性', '持有', '同步大市', '减持', '卖出', '回避', '弱于大市', '跑输行业')
+_RATING = '|'.join(sorted(RATINGS, key=len, reverse=True))
+_RATING_PATTERNS = [
+    re.compile(rf'评级\s*[：:]\s*[“"「]?({_RATING})'),  # 投资评级：买入（维持）
+    re.compile(rf'(?:维持|给予|上调至|下调至|首次覆盖给予|首次覆盖)\s*[“"「]?({_RATING})[”"」]?\s*评\s*级'),  # 维持“买入”评级（可能跨行）
+    re.compile(rf'({_RATING})\s*[（(/]\s*(?:维持|首次|上调|下调)'),  # 强烈推荐（维持评级） / 买入/维持
+]
+# 目标价：65 / 目标价格为35.2元（数字须与“目标价”在同一行）
+_TARGET_PRICE_PATTERN = re.compile(r'目标价(?:格|位)?\s*[为至]?\s*[：:]?[ \t　]*(\d+(?:\.\d+)?)')
+_BLANK_LINES_PATTERN = re.compile(r'\n\s*\n+')
+
+
+def extract_rating(text):
+    """从研报文本中提取投资评级，找不到时返回None"""
+    for pattern in _RATING_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1)
+    return None
+
+
+def extract_target_price(text):
+    """从研报文本中提取目标价（元），找不到时返回None"""
+    for match in _TARGET_PRICE_PATTERN.finditer(text):
+        price = float(match.group(1))
+        if price > 0:
+            return price
+    return None
+
+
+def _extract_pdf(path, max_pages=REPORT_EXTRACT_MAX_PAGES):
+    """进程池任务：解析单个PDF，返回逐页文本、评级与目标价（解析失败时只返回error）"""
+    start = time.perf_counter()
+    try:
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        page_count = len(reader.pages)
+        pages = [
+            _BLANK_LINES_PATTERN.sub('\n', page.extract_text() or '').strip()
+            for page in reader.pages[:max_pages]
+        ]
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {str(e)}", 'seconds': time.perf_counter() - start}
+
+    head = '\n'.join(pages[:REPORT_RATING_PAGES])
+    return {
+        'pages': pages,
+        'page_count': page_count,
+        'text_length': sum(len(text) for text in pages),
+        'rating': extract_rating(head),
+        'target_price': extract_target_price(head),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def _report_update(result):
+    """回填到研报记录的评级、目标价与页数"""
+    return {'$set': {
+        'rating': result.get('rating'),
+        'target_price': result.get('target_price'),
+        'page_count': result.get('page_count'),
+        'text_extracted': True,
+    }, '$unset': {'exported': ''}}  # 评级回填后重新导出Parquet快照
+
+
+class ReportExtractor(object):
+    """单只股票的研报文本抽取，文件以(路径, 大小, 修改时间)记录，未变化的文件重扫时无需重新计算哈希"""
+
+    def __init__(self, stock_code, stock_name=None, db_name='stock_sentiment', workers=REPORT_EXTRACT_WORKERS):
+        self.stock_code = stock_code
+        self.stock_name = stock_name
+        self.workers = workers
+        self.text_mongo = MongoAPI(db_name, f'report_text_{stock_code}')
+        self.report_mongo = MongoAPI(db_name, f'report_{stock_code}')
+
+    def report_dirs(self):
+        """爬虫按股票代码保存PDF，历史数据按股票名称存放，两者都扫描"""
+        names = [self.stock_code] + ([self.stock_name] if self.stock_name else [])
+        return [os.path.join(REPORT_PDF_DIR, name) for name in names
+                if os.path.isdir(os.path.join(REPORT_PDF_DIR, name))]
+
+    def scan_files(self):
+        """研报目录下的全部PDF路径"""
+        paths = []
+        for directory in self.report_dirs():
+            for entry in os.scandir(directory):
+                if entry.is_file() and entry.name.lower().endswith('.pdf'):
+                    paths.append(entry.path)
+        return sorted(paths)
+
+    def _pending_files(self, paths, force=False):
+        """
+        返回 (待解析 {sha256: 文件信息}, 新路径的已处理文件 [(sha256, 文件信息)])
+        路径、大小、修改时间都未变化的文件直接跳过，其余计算哈希后与已处理的哈希比对
+        """
+        seen_files = set()
+        known_hashes = set()
+        for doc in self.text_mongo.find({}, {'files': 1}):
+            known_hashes.add(doc['_id'])
+            for f in doc.get('files') or []:
+                seen_files.add((f['path'], f['size'], f['mtime']))
+
+        pending, moved = {}, []
+        for path in paths:
+            stat = os.stat(path)
+            file_info = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+            if not force and (path, stat.st_size, stat.st_mtime) in seen_files:
+                continue
+            sha256 = sha256_of_file(path).hexdigest()
+            if sha256 in pending:
+                moved.append((sha256, file_info))
+            elif sha256 in known_hashes and not force:
+                moved.append((sha256, file_info))
+            else:
+                pending[sha256] = file_info
+        return pending, moved
+
+    def extract(self, force=False):
+        """抽取尚未处理的研报文本，返回新解析的文件数"""
+        start_time = time.time()
+        paths = self.scan_files()
+        pending, moved = self._pending_files(paths, force=force)
+
+        with self.text_mongo.bulk_writer() as text_writer, self.report_mongo.bulk_writer() as report_writer:
+            for sha256, file_info, result in self._run(pending):
+                self._save(text_writer, report_writer, sha256, file_info, result)
+
+            # 同一内容出现在新路径（重命名或重复下载）时只记录路径（先写入新解析的文档）
+            text_writer.flush()
+            for sha256, file_info in moved:
+                text_writer.update({'_id': sha256}, {'$addToSet': {'files': file_info}})
+            self._backfill_reports(report_writer, exclude=pending)
+
+        elapsed = time.time() - start_time
+        print(f"[ReportExtractor] {self.stock_code} 扫描{len(paths)}个PDF，新解析{len(pending)}个，"
+              f"用时{elapsed:.2f}秒")
+        return len(pending)
+
+    def _backfill_reports(self, report_writer, exclude=()):
+        """
+        文件未变化或哈希已处理时不会重新解析，新爬取的研报记录指向相同内容时，
+        用已有的抽取结果回填（exclude为本次刚解析、已在_save中回填的哈希）
+        """
+        hashes = {doc['sha256'] for doc in self.report_mongo.find(
+            {'sha256': {'$exists': True}, 'text_extracted': {'$exists': False}}, {'sha256': 1})}
+        hashes.difference_update(exclude)
+        if not hashes:
+            return
+        for doc in self.text_mongo.find({'_id': {'$in': list(hashes)}, 'error': {'$exists': False}},
+                                        {'rating': 1, 'target_price': 1, 'page_count': 1}):
+            report_writer.update_many({'sha256': doc['_id'], 'text_extracted': {'$exists': False}},
+                                      _report_update(doc))
+
+    def _run(self, pending):
+        """逐个产出 (sha256, 文件信息, 解析结果)，多进程时按完成顺序产出"""
+        items = list(pending.items())
+        if self.workers <= 1 or len(items) <= 1:
+            for sha256, file_info in items:
+                yield sha256, file_info, _extract_pdf(file_info['path'])
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(_extract_pdf, file_info['path']): (sha256, file_info)
+                       for sha256, file_info in items}
+            for future in as_completed(futures):
+                sha256, file_info = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:  # 子进程异常退出
+                    result = {'error': f"{type(e).__name__}: {str(e)}", 'seconds': 0.0}
+                yield sha256, file_info, result
+
+    def _save(self, text_writer, report_writer, sha256, file_info, result):
+        metrics.observe('crawl_stage_seconds', result['seconds'], stage='extract', source='report',
+                        stock=self.stock_code)
+        fields = {
+            'file_path': file_info['path'],
+            'file_size': file_info['size'],
+            'extract_time': datetime.now().isoformat(),
+        }
+        if 'error' in result:
+            # 失败也记录，避免每次重扫都重新解析损坏的文件
+            fields['error'] = result['error']
+            metrics.inc('report_extract_failures_total', stock=self.stock_code)
+            print(f"  [失败] {os.path.basename(file_info['path'])}: {result['error']}")
+        else:
+            fields.update({key: result[key] for key in ('pages', 'page_count', 'text_length', 'rating', 'target_price')})
+            metrics.inc('report_pages_extracted_total', len(result['pages']), stock=self.stock_code)
+            report_writer.update_many({'sha256': sha256}, _report_update(result))
+            print(f"  [抽取] {os.path.basename(file_info['path'])} {result['page_count']}页 "
+                  f"评级: {result['rating']} 目标价: {result['target_price']}")
+        update = {'$set': fields, '$addToSet': {'files': file_info}}
+        if 'error' not in result:
+            update['$unset'] = {'error': ''}
+        text_writer.update({'_id': sha256}, update, upsert=True)
+
+
+def extract_reports(stock_list=STOCK_LIST, workers=REPORT_EXTRACT_WORKERS, force=False):
+    """抽取多只股票的研报文本，返回新解析的文件总数"""
+    total = 0
+    for stock_code, stock_name in stock_list:
+        try:
+            total += ReportExtractor(stock_code, stock_name, workers=workers).extract(force=force)
+        except Exception as e:
+            print(f"[ReportExtractor] {stock_code} 抽取异常: {str(e)}")
+    return total
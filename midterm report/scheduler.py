@@ -0,0 +1,206 @@
+"""
+有界任务调度器
+固定数量的工作线程按优先级取任务，并按域名限制同时运行的任务数；
+爬取流程拆分为(股票, 数据源, 页)粒度的任务，互不依赖的阶段可以交错执行
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+from config import MAX_THREADS, SCHEDULER_DOMAIN_LIMITS, HTTP_MAX_PER_HOST
+
+# 任务优先级（数值越小越先执行）
+PRIORITY_POST = 0
+PRIORITY_COMMENT = 1
+PRIORITY_REPORT = 2
+PRIORITY_NEWS = 2
+PRIORITY_DOWNLOAD = 3
+
+
+class Task(object):
+    """调度单元：fn(*args, **kwargs)，执行期间占用domains中每个域名的一个并发名额"""
+
+    def __init__(self, fn, args, kwargs, name, priority, domains):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.name = name or getattr(fn, '__name__', 'task')
+        self.priority = priority
+        self.domains = tuple(domains)
+
+
+class TaskScheduler(object):
+    """有界线程池 + 优先级队列 + 按域名并发限制"""
+
+    def __init__(self, max_workers=MAX_THREADS, domain_limits=None, default_limit=HTTP_MAX_PER_HOST):
+        self.max_workers = max_workers
+        self.domain_limits = dict(SCHEDULER_DOMAIN_LIMITS if domain_limits is None else domain_limits)
+        self.default_limit = default_limit
+        self._heap = []  # (priority, seq, task)
+        self._seq = itertools.count()
+        self._running = {}  # domain -> 运行中的任务数
+        self._unfinished = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._workers = []
+        self.completed = 0
+        self.failed = 0
+        self._start_time = None
+
+    def submit(self, fn, *args, name=None, priority=0, domains=(), **kwargs):
+        """提交任务（任务中也可以继续提交后续任务）"""
+        task = Task(fn, args, kwargs, name, priority, domains)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("调度器已关闭")
+            heapq.heappush(self._heap, (priority, next(self._seq), task))
+            self._unfinished += 1
+            self._cond.notify()
+        return task
+
+    def start(self):
+        """启动工作线程"""
+        if self._workers:
+            return self
+        self._start_time = time.time()
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._work, name=f"scheduler-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        print(f"[Scheduler] 启动{self.max_workers}个工作线程")
+        return self
+
+    def join(self):
+        """阻塞直到所有任务（包括执行中派生的任务）完成"""
+        with self._cond:
+            while self._unfinished:
+                self._cond.wait()
+
+    def shutdown(self):
+        """停止工作线程（未执行的任务被丢弃）"""
+        with self._cond:
+            self._closed = True
+            self._unfinished -= len(self._heap)
+            self._heap = []
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        elapsed = time.time() - self._start_time if self._start_time else 0.0
+        print(f"[Scheduler] 完成{self.completed}个任务，失败{self.failed}个，用时{elapsed:.2f}秒")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.join()
+        self.shutdown()
+
+    def _limit(self, domain):
+        return self.domain_limits.get(domain, self.default_limit)
+
+    def _pop_runnable(self):
+        """按优先级取出第一个所有域名都有空闲名额的任务（需持有锁）"""
+        skipped = []
+        task = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if all(self._running.get(d, 0) < self._limit(d) for d in entry[2].domains):
+                task = entry[2]
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return task
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    task = self._pop_runnable()
+                    if task is not None:
+                        break
+                    self._cond.wait()
+                for domain in task.domains:
+                    self._running[domain] = self._running.get(domain, 0) + 1
+
+            try:
+                task.fn(*task.args, **task.kwargs)
+                ok = True
+            except Exception as e:
+                print(f"[Scheduler] 任务 {task.name} 异常: {str(e)}")
+                ok = False
+
+            with self._cond:
+                for domain in task.domains:
+                    self._running[domain] -= 1
+                self._unfinished -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
+
+
+class PagedJob(object):
+    """
+    单只股票单个数据源的分页任务组
+    sequential=True 时上一页完成后才提交下一页，stop_when(本页结果)为真时提前停止翻页；
+    否则一次提交全部页并发执行。所有页结束后调用 on_finish()
+    domains 可以是元组，也可以是 page -> 元组 的函数
+    """
+
+    def __init__(self, scheduler, name, pages, run_page, on_finish=None, priority=0, domains=(),
+                 sequential=True, stop_when=None):
+        self.scheduler = scheduler
+        self.name = name
+        self.pages = pages
+        self.run_page = run_page
+        self.on_finish = on_finish
+        self.priority = priority
+        self.domains = domains
+        self.sequential = sequential
+        self.stop_when = stop_when
+        self._remaining = pages
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.pages <= 0:
+            self._finish()
+        elif self.sequential:
+            self._submit(1)
+        else:
+            for page in range(1, self.pages + 1):
+                self._submit(page)
+        return self
+
+    def _submit(self, page):
+        domains = self.domains(page) if callable(self.domains) else self.domains
+        self.scheduler.submit(self._run, page, name=f"{self.name}#{page}", priority=self.priority, domains=domains)
+
+    def _run(self, page):
+        try:
+            result = self.run_page(page)
+        except Exception as e:
+            print(f"[Scheduler] {self.name} 第{page}页异常: {str(e)}")
+            result = None
+
+        if self.sequential:
+            if page < self.pages and not (self.stop_when is not None and self.stop_when(result)):
+                self._submit(page + 1)
+                return
+        else:
+            with self._lock:
+                self._remaining -= 1
+                if self._remaining:
+                    return
+        self._finish()
+
+    def _finish(self):
+        if self.on_finish is not None:
+            self.on_finish()
@@ -0,0 +1,129 @@
+"""
+情感打分服务
+SKEP模型进程内只加载一次，按文本长度分桶批量打分，
+按规范化文本哈希缓存分数（重复/转发的标题不重复打分），并批量回写pos_p
+"""
+
+import threading
+import time
+
+from config import SKEP_MODEL_DIR, SENTIMENT_BATCH_SIZE, SENTIMENT_USE_GPU
+from dedup import NOT_DUPLICATE
+from mongodb import MongoAPI
+from sentiment_rollup import SentimentRollup
+from utils import normalize_text, text_hash
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def load_skep_model(directory=SKEP_MODEL_DIR):
+    """加载SKEP情感模型（进程内单例）"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            import paddlehub as hub
+            print(f"[Sentiment] 加载模型: {directory}")
+            _model = hub.Module(directory=directory)
+        return _model
+
+
+class SentimentScorer(object):
+    """
+    批量情感打分器
+    model: 需提供 predict_sentiment(texts, use_gpu) -> [{'positive_probs': float}, ...]，
+           默认为SKEP模型，测试时可传入桩对象
+    """
+
+    def __init__(self, model=None, batch_size=SENTIMENT_BATCH_SIZE, use_gpu=SENTIMENT_USE_GPU, persist_cache=True):
+        self._model = model
+        self.batch_size = batch_size
+        self.use_gpu = use_gpu
+        self.cache = {}  # text_hash -> pos_p
+        self.cache_mongo = MongoAPI('stock_sentiment', 'sentiment_cache') if persist_cache else None
+        self.total_texts = 0
+        self.model_texts = 0
+        self.total_seconds = 0.0
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load_skep_model()
+        return self._model
+
+    def score(self, texts):
+        """返回与texts顺序一致的正面概率列表（空文本为None）"""
+        start = time.perf_counter()
+        keys = [text_hash(text) for text in texts]
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in self.cache and key not in pending:
+                normalized = normalize_text(text)
+                if normalized:
+                    pending[key] = normalized
+
+        if pending and self.cache_mongo is not None:
+            for doc in self.cache_mongo.find({'_id': {'$in': list(pending)}}, {'pos_p': 1}):
+                self.cache[doc['_id']] = doc['pos_p']
+                pending.pop(doc['_id'], None)
+
+        if pending:
+            pending_keys = list(pending)
+            scores = self._predict([pending[key] for key in pending_keys])
+            self.cache.update(zip(pending_keys, scores))
+            self.model_texts += len(pending_keys)
+            if self.cache_mongo is not None:
+                with self.cache_mongo.bulk_writer() as writer:
+                    for key, value in zip(pending_keys, scores):
+                        writer.upsert({'_id': key, 'pos_p': value})
+
+        elapsed = time.perf_counter() - start
+        self.total_texts += len(texts)
+        self.total_seconds += elapsed
+        print(f"[Sentiment] 打分{len(texts)}条（模型推理{len(pending)}条），"
+              f"用时{elapsed:.2f}秒，{len(texts) / max(elapsed, 1e-9):.0f} texts/s")
+        return [self.cache.get(key) for key in keys]
+
+    def _predict(self, texts):
+        """按长度排序后分批推理，长度相近的文本同批以减少padding"""
+        results = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch_idx = order[start:start + self.batch_size]
+            output = self.model.predict_sentiment([texts[i] for i in batch_idx], use_gpu=self.use_gpu)
+            for i, item in zip(batch_idx, output):
+                results[i] = float(item['positive_probs'])
+        return results
+
+    def score_posts(self, stock_code, db_name='stock_sentiment', rescore=False):
+        """为指定股票尚未打分的非重复发帖打分，批量回写pos_p并增量更新情感汇总桶，返回打分条数"""
+        post_mongo = MongoAPI(db_name, f'post_{stock_code}')
+        query = dict(NOT_DUPLICATE) if rescore else dict(NOT_DUPLICATE, pos_p={'$exists': False})
+        posts = list(post_mongo.find(query, {'post_title': 1}))
+        if not posts:
+            print(f"[Sentiment] {stock_code} 没有待打分的发帖")
+            return 0
+
+        scores = self.score([post.get('post_title', '') for post in posts])
+        written = 0
+        with post_mongo.bulk_writer() as writer:
+            for post, pos_p in zip(posts, scores):
+                if pos_p is not None:
+                    if rescore:
+                        # 分数变化时清除汇总标记和导出标记：汇总时按新分数重算该发帖所在日期的桶，下次增量导出写入新行
+                        writer.update({'_id': post['_id'], 'pos_p': {'$ne': pos_p}},
+                                      {'$set': {'pos_p': pos_p}, '$unset': {'rolled_up': '', 'sentiment_exported': ''}})
+                    else:
+                        writer.upsert({'_id': post['_id'], 'pos_p': pos_p})
+                    written += 1
+        SentimentRollup(stock_code, db_name).apply_new_posts()
+        return written
+
+    def stats(self):
+        return {
+            'texts': self.total_texts,
+            'model_texts': self.model_texts,
+            'cache_size': len(self.cache),
+            'seconds': self.total_seconds,
+            'texts_per_sec': self.total_texts / self.total_seconds if self.total_seconds else 0.0,
+        }
@@ -0,0 +1,139 @@
+"""
+情感时间序列预聚合
+按股票维护15分钟/小时/日三种粒度的情感汇总桶（条数、pos_p之和、直方图），
+新打分的发帖到来时只重算其所在日期的桶，图表查询只需读取桶而无需扫描全部发帖
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from config import SENTIMENT_HIST_BINS
+from dedup import NOT_DUPLICATE
+from mongodb import MongoAPI
+
+# 粒度 -> 桶长度（分钟）
+GRANULARITIES = {
+    '15min': 15,
+    '1h': 60,
+    '1d': 24 * 60,
+}
+
+
+def parse_post_time(post_date, post_time='', now=None):
+    """
+    解析发帖时间，支持 "2024-12-05" 与缺少年份的 "12-05" 两种日期格式
+    缺少年份时取当前年份，若得到未来时间则视为上一年
+    """
+    now = now or datetime.now()
+    post_date = (post_date or '').strip()
+    post_time = (post_time or '').strip()[:5] or '00:00'
+    for fmt, has_year in (('%Y-%m-%d %H:%M', True), ('%m-%d %H:%M', False)):
+        try:
+            parsed = datetime.strptime(f"{post_date} {post_time}", fmt)
+        except ValueError:
+            continue
+        if not has_year:
+            parsed = parsed.replace(year=now.year)
+            if parsed > now:
+                parsed = parsed.replace(year=now.year - 1)
+        return parsed
+    return None
+
+
+def bucket_start(timestamp, granularity):
+    """时间戳所在桶的起始时间"""
+    minutes = GRANULARITIES[granularity]
+    if minutes >= 24 * 60:
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    minute_of_day = timestamp.hour * 60 + timestamp.minute
+    start = minute_of_day - minute_of_day % minutes
+    return timestamp.replace(hour=start // 60, minute=start % 60, second=0, microsecond=0)
+
+
+def _hist_bin(pos_p):
+    return min(int(pos_p * SENTIMENT_HIST_BINS), SENTIMENT_HIST_BINS - 1)
+
+
+class SentimentRollup(object):
+    """单只股票的情感汇总桶"""
+
+    def __init__(self, stock_code, db_name='stock_sentiment'):
+        self.stock_code = stock_code
+        self.post_mongo = MongoAPI(db_name, f'post_{stock_code}')
+        self.rollup_mongo = MongoAPI(db_name, f'sentiment_rollup_{stock_code}')
+
+    def apply_new_posts(self):
+        """
+        汇总已打分但尚未汇总的发帖，返回处理条数
+        桶不做$inc累加，而是按发帖的rollup_time重新计算涉及的每一天（日桶及其中的15分钟/小时桶）后整体覆盖：
+        依次写入rollup_time、覆盖桶、标记rolled_up，任一步中断后重跑结果相同，不会重复计数
+        """
+        posts = list(self.post_mongo.find(
+            dict(NOT_DUPLICATE, pos_p={'$ne': None},
+                 **{'$or': [{'rolled_up': {'$exists': False}}, {'rollup_time': {'$exists': False}}]}),
+            {'post_date': 1, 'post_time': 1}
+        ))
+        if not posts:
+            return 0
+
+        # 1. 记录发帖时间（无法解析的记为None，不计入任何桶）
+        days = set()
+        with self.post_mongo.bulk_writer() as writer:
+            for post in posts:
+                timestamp = parse_post_time(post.get('post_date'), post.get('post_time'))
+                if timestamp is not None:
+                    days.add(bucket_start(timestamp, '1d'))
+                writer.upsert({'_id': post['_id'], 'rollup_time': timestamp})
+
+        # 2. 按当天全部已打分发帖重新计算涉及的桶
+        buckets = self._compute_buckets(sorted(days))
+        with self.rollup_mongo.bulk_writer() as writer:
+            for (granularity, start), bucket in buckets.items():
+                writer.update(
+                    {'_id': f"{granularity}|{start.isoformat()}"},
+                    {'$set': {'granularity': granularity, 'bucket_start': start, 'count': bucket['count'],
+                              'sum_pos_p': bucket['sum_pos_p'],
+                              'hist': {str(b): n for b, n in bucket['hist'].items()}}},
+                    upsert=True
+                )
+
+        # 3. 桶写入成功后再标记发帖
+        with self.post_mongo.bulk_writer() as writer:
+            for post in posts:
+                writer.upsert({'_id': post['_id'], 'rolled_up': True})
+        print(f"[SentimentRollup] {self.stock_code} 汇总{len(posts)}条发帖，重算{len(days)}天共{len(buckets)}个桶")
+        return len(posts)
+
+    def _compute_buckets(self, days, chunk_size=200):
+        """从发帖重新计算给定各天内的全部桶"""
+        buckets = defaultdict(lambda: {'count': 0, 'sum_pos_p': 0.0, 'hist': defaultdict(int)})
+        for i in range(0, len(days), chunk_size):
+            ranges = [{'rollup_time': {'$gte': day, '$lt': day + timedelta(days=1)}} for day in days[i:i + chunk_size]]
+            for post in self.post_mongo.find(dict(NOT_DUPLICATE, pos_p={'$ne': None}, **{'$or': ranges}),
+                                             {'pos_p': 1, 'rollup_time': 1}):
+                for granularity in GRANULARITIES:
+                    bucket = buckets[(granularity, bucket_start(post['rollup_time'], granularity))]
+                    bucket['count'] += 1
+                    bucket['sum_pos_p'] += post['pos_p']
+                    bucket['hist'][_hist_bin(post['pos_p'])] += 1
+        return buckets
+
+    def get_series(self, granularity='15min', start=None, end=None):
+        """读取时间窗口内的桶，返回按时间排序的 [{'time', 'count', 'mean', 'hist'}]"""
+        query = {'granularity': granularity}
+        if start or end:
+            query['bucket_start'] = {}
+            if start:
+                query['bucket_start']['$gte'] = start
+            if end:
+                query['bucket_start']['$lt'] = end
+        series = []
+        for doc in self.rollup_mongo.find(query, {'_id': 0}).sort('bucket_start', 1):
+            hist = doc.get('hist', {})
+            series.append({
+                'time': doc['bucket_start'],
+                'count': doc['count'],
+                'mean': doc['sum_pos_p'] / doc['count'] if doc['count'] else None,
+                'hist': [hist.get(str(b), 0) for b in range(SENTIMENT_HIST_BINS)],
+            })
+        return series
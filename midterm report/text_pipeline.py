@@ -0,0 +1,113 @@
+"""
+分词流水线
+jieba词性标注分词按块分发到进程池并行执行；分词结果按文本哈希持久化缓存，并写回发帖文档
+"""
+
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import jieba.posseg as pseg
+
+from config import TOKENIZE_WORKERS, TOKENIZE_CHUNK_SIZE
+from dedup import NOT_DUPLICATE
+from keyword_store import KeywordStore
+from mongodb import MongoAPI
+from utils import text_hash
+
+# 自定义金融领域停用词表
+FINANCE_STOPWORDS = frozenset([
+    '的', '了', '在', '是', '和', '到', '一', '个', '为', '与', '从', '这', '那', '会',
+    '把', '被', '比', '将', '于', '上', '下', '中', '有', '没', '但', '要', '也', '还',
+    '很', '更', '最', '或', '及', '其他', '等', '所', '能', '可', '不', '只', '如果',
+    '因为', '所以', '如今', '现在', '今天', '明天', '昨天', '周一', '周二', '周三', '周四', '周五',
+    '月', '日', '年', '号', '点', '分', '秒', '据', '来源', '原文', '记者', '编辑', '发布',
+    '网友', '用户', '投资者', '分析师', '专家'
+])
+
+# 过滤的词性：标点(x)、助词(u)、连词(c)
+EXCLUDED_POS = frozenset(['x', 'u', 'c'])
+
+_CLEAN_PATTERN = re.compile(r'[^\u4e00-\u9fff\w]')
+
+
+def preprocess_text(text):
+    """清洗文本：移除特殊字符"""
+    return _CLEAN_PATTERN.sub('', str(text))
+
+
+def tokenize_and_filter(text):
+    """分词、去停用词、词性过滤"""
+    return [
+        word for word, flag in pseg.cut(preprocess_text(text))
+        if word not in FINANCE_STOPWORDS and len(word) > 1 and flag not in EXCLUDED_POS
+    ]
+
+
+def _tokenize_chunk(texts):
+    """进程池任务：对一块文本分词"""
+    return [tokenize_and_filter(text) for text in texts]
+
+
+class Tokenizer(object):
+    """带缓存的并行分词器"""
+
+    def __init__(self, workers=TOKENIZE_WORKERS, chunk_size=TOKENIZE_CHUNK_SIZE, persist_cache=True):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache = {}  # text_hash -> tokens
+        self.cache_mongo = MongoAPI('stock_sentiment', 'token_cache') if persist_cache else None
+
+    def tokenize(self, texts):
+        """返回与texts顺序一致的分词结果，只对缓存中没有的文本分词"""
+        start = time.perf_counter()
+        keys = [text_hash(text) for text in texts]
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in self.cache and key not in pending:
+                pending[key] = text
+
+        if pending and self.cache_mongo is not None:
+            for doc in self.cache_mongo.find({'_id': {'$in': list(pending)}}, {'tokens': 1}):
+                self.cache[doc['_id']] = doc['tokens']
+                pending.pop(doc['_id'], None)
+
+        if pending:
+            pending_keys = list(pending)
+            tokens_list = self._tokenize_parallel([pending[key] for key in pending_keys])
+            self.cache.update(zip(pending_keys, tokens_list))
+            if self.cache_mongo is not None:
+                with self.cache_mongo.bulk_writer() as writer:
+                    for key, tokens in zip(pending_keys, tokens_list):
+                        writer.upsert({'_id': key, 'tokens': tokens})
+
+        elapsed = time.perf_counter() - start
+        print(f"[Tokenizer] 分词{len(texts)}条（新分词{len(pending)}条），用时{elapsed:.2f}秒")
+        return [self.cache[key] for key in keys]
+
+    def _tokenize_parallel(self, texts):
+        if self.workers <= 1 or len(texts) <= self.chunk_size:
+            return _tokenize_chunk(texts)
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        results = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for chunk_tokens in executor.map(_tokenize_chunk, chunks):
+                results.extend(chunk_tokens)
+        return results
+
+    def tokenize_posts(self, stock_code, db_name='stock_sentiment', retokenize=False):
+        """为指定股票尚未分词的非重复发帖分词，把tokens写回文档并增量更新按天词频，返回处理条数"""
+        post_mongo = MongoAPI(db_name, f'post_{stock_code}')
+        query = dict(NOT_DUPLICATE) if retokenize else dict(NOT_DUPLICATE, tokens={'$exists': False})
+        posts = list(post_mongo.find(query, {'post_title': 1}))
+        if not posts:
+            print(f"[Tokenizer] {stock_code} 没有待分词的发帖")
+            return 0
+
+        tokens_list = self.tokenize([post.get('post_title', '') for post in posts])
+        with post_mongo.bulk_writer() as writer:
+            for post, tokens in zip(posts, tokens_list):
+                # 重新分词后清除kw_counted，按天词频随之重算
+                writer.update({'_id': post['_id']}, {'$set': {'tokens': tokens}, '$unset': {'kw_counted': ''}})
+        KeywordStore(stock_code, db_name).apply_new_posts()
+        return len(posts)
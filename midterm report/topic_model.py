@@ -0,0 +1,154 @@
+"""
+增量主题聚类
+HashingVectorizer无状态向量化 + MiniBatchKMeans.partial_fit在线更新，
+模型状态持久化到本地，新发帖到来时只对新发帖分配主题
+"""
+
+import os
+import pickle
+from collections import Counter, deque
+
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from config import TOPIC_CLUSTERS, TOPIC_MODEL_DIR, TOPIC_SAMPLE_SIZE, TOPIC_RECENTER_EVERY
+from dedup import NOT_DUPLICATE
+from mongodb import MongoAPI
+from utils import create_dir
+
+_MAX_TERMS_PER_TOPIC = 200  # 每个主题保留的关键词计数上限
+
+
+class OnlineTopicModel(object):
+    """在线主题模型：输入为空格分隔的分词文本"""
+
+    def __init__(self, n_clusters=TOPIC_CLUSTERS, n_features=2 ** 18, sample_size=TOPIC_SAMPLE_SIZE,
+                 recenter_every=TOPIC_RECENTER_EVERY, random_state=42):
+        self.n_clusters = n_clusters
+        self.recenter_every = recenter_every
+        self.random_state = random_state
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            tokenizer=str.split,
+            token_pattern=None,
+            lowercase=False,
+        )
+        self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3)
+        self.fitted = False
+        self.sample = deque(maxlen=sample_size)  # 近期文本样本，用于有界内存的重新定心
+        self.topic_terms = [Counter() for _ in range(n_clusters)]
+        self.updates = 0
+
+    def update(self, texts):
+        """用新文本增量训练并返回其主题编号（空文本或样本不足时为None）"""
+        texts = list(texts)
+        valid = [i for i, text in enumerate(texts) if text]
+        self.sample.extend(texts[i] for i in valid)
+        labels = [None] * len(texts)
+
+        if not self.fitted:
+            # 首次训练需要至少n_clusters条样本
+            if len(self.sample) < self.n_clusters:
+                return labels
+            self.kmeans.partial_fit(self.vectorizer.transform(list(self.sample)))
+            self.fitted = True
+        elif valid:
+            batch = [texts[i] for i in valid]
+            if len(batch) >= self.n_clusters:
+                self.kmeans.partial_fit(self.vectorizer.transform(batch))
+
+        if valid:
+            predicted = self.kmeans.predict(self.vectorizer.transform([texts[i] for i in valid]))
+            for i, topic in zip(valid, predicted):
+                labels[i] = int(topic)
+                self._count_terms(int(topic), texts[i])
+
+        self.updates += 1
+        if self.recenter_every and self.updates % self.recenter_every == 0:
+            self.recenter()
+        return labels
+
+    def assign(self, texts):
+        """只分配主题，不更新模型"""
+        if not self.fitted:
+            return [None] * len(texts)
+        return [int(topic) if text else None
+                for text, topic in zip(texts, self.kmeans.predict(self.vectorizer.transform(list(texts))))]
+
+    def recenter(self):
+        """以当前中心为初值，在近期样本上重新拟合中心，并重建各主题关键词计数"""
+        if not self.fitted or len(self.sample) < self.n_clusters:
+            return
+        sample = list(self.sample)
+        features = self.vectorizer.transform(sample)
+        kmeans = MiniBatchKMeans(n_clusters=self.n_clusters, init=self.kmeans.cluster_centers_,
+                                 n_init=1, random_state=self.random_state)
+        kmeans.fit(features)
+        self.kmeans = kmeans
+        self.topic_terms = [Counter() for _ in range(self.n_clusters)]
+        for text, topic in zip(sample, kmeans.predict(features)):
+            self._count_terms(int(topic), text)
+        print(f"[TopicModel] 已在{len(sample)}条近期样本上重新定心")
+
+    def top_keywords(self, topic, n=10):
+        return [word for word, _ in self.topic_terms[topic].most_common(n)]
+
+    def _count_terms(self, topic, text):
+        counter = self.topic_terms[topic]
+        counter.update(text.split())
+        if len(counter) > 2 * _MAX_TERMS_PER_TOPIC:
+            self.topic_terms[topic] = Counter(dict(counter.most_common(_MAX_TERMS_PER_TOPIC)))
+
+    def save(self, path):
+        create_dir(os.path.dirname(path) or '.')
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def model_path(stock_code):
+    return os.path.join(TOPIC_MODEL_DIR, f"topic_{stock_code}.pkl")
+
+
+def update_post_topics(stock_code, db_name='stock_sentiment'):
+    """
+    为已分词但未分配主题的发帖增量分配主题，写回topic字段并保存模型，返回处理条数
+    模型首次训练前（样本不足n_clusters条）的发帖只加入样本并标记topic_sampled，
+    之后不再重复加入样本，模型训练完成后再为其补分配主题
+    """
+    path = model_path(stock_code)
+    model = OnlineTopicModel.load(path) if os.path.exists(path) else OnlineTopicModel()
+
+    post_mongo = MongoAPI(db_name, f'post_{stock_code}')
+    posts = list(post_mongo.find(dict(NOT_DUPLICATE, tokens={'$exists': True}, topic={'$exists': False}),
+                                 {'tokens': 1, 'topic_sampled': 1}))
+    if not posts:
+        print(f"[TopicModel] {stock_code} 没有待分配主题的发帖")
+        return 0
+
+    fresh = [post for post in posts if not post.get('topic_sampled')]
+    sampled = [post for post in posts if post.get('topic_sampled')]
+    labels = model.update([' '.join(post['tokens']) for post in fresh]) if fresh else []
+    if model.fitted and sampled:
+        fresh += sampled
+        labels += model.assign([' '.join(post['tokens']) for post in sampled])
+
+    written = 0
+    with post_mongo.bulk_writer() as writer:
+        for post, topic in zip(fresh, labels):
+            if topic is not None:
+                # topic是情感数据集的列，清除sentiment_exported使下次增量导出写入新行
+                writer.update({'_id': post['_id']},
+                              {'$set': {'topic': topic}, '$unset': {'topic_sampled': '', 'sentiment_exported': ''}})
+                written += 1
+            elif not model.fitted and post['tokens']:
+                writer.upsert({'_id': post['_id'], 'topic_sampled': True})
+    model.save(path)
+    print(f"[TopicModel] {stock_code} 分配主题{written}条")
+    return written
@@ -1,28 +1,81 @@
-import requests
+# selenium、webdriver_manager、pandas、bs4、fake_useragent、requests 导入较慢，只在用到的函数内导入，
+# 只走HTTP的进程（如资讯抓取）启动时不加载浏览器和数据处理依赖
 import random
+import hashlib
+import json
+import re
+import unicodedata
 import time
 import os
-from fake_useragent import UserAgent
-from bs4 import BeautifulSoup
-import pandas as pd
-from config import PROXIES_POOL, SELENIUM_TIMEOUT
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-
-# 初始化User-Agent池
-ua = UserAgent()
-HEADERS_POOL = [
-    {"User-Agent": ua.chrome},
-    {"User-Agent": ua.firefox},
-    {"User-Agent": ua.safari}
+import threading
+from urllib.parse import urlsplit
+from config import PROXIES_POOL, SELENIUM_TIMEOUT, UA_CACHE_FILE, UA_BROWSERS
+from rate_limiter import get_rate_limiter
+import metrics
+
+# 本地缓存缺失时使用的User-Agent
+DEFAULT_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
 ]
 
+_headers_pool = None
+_headers_pool_lock = threading.Lock()
+
+
+def load_user_agents(path=UA_CACHE_FILE):
+    """从本地缓存文件读取User-Agent列表（{浏览器: [UA, ...]}），文件缺失或损坏时返回默认列表"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        user_agents = [ua for browser in UA_BROWSERS for ua in data.get(browser, [])]
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"[UA] 读取User-Agent缓存失败({str(e)})，使用默认列表")
+        return list(DEFAULT_USER_AGENTS)
+    return user_agents or list(DEFAULT_USER_AGENTS)
+
+
+def refresh_user_agent_cache(path=UA_CACHE_FILE, per_browser=8):
+    """用fake_useragent重新生成本地User-Agent缓存（需要安装fake-useragent），返回写入的UA数"""
+    from fake_useragent import UserAgent
+    data = {}
+    for browser in UA_BROWSERS:
+        ua = UserAgent(browsers=[browser.capitalize()], platforms="desktop")
+        agents = set()
+        for _ in range(per_browser * 20):
+            agents.add(ua.random)
+            if len(agents) >= per_browser:
+                break
+        data[browser] = sorted(agents)
+    directory = os.path.dirname(path)
+    if directory:
+        create_dir(directory)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    reset_headers_pool()
+    return sum(len(agents) for agents in data.values())
+
+
+def reset_headers_pool():
+    """丢弃已加载的请求头池，下次使用时重新读取缓存文件"""
+    global _headers_pool
+    with _headers_pool_lock:
+        _headers_pool = None
+
+
+def get_headers_pool():
+    """请求头池（首次使用时从本地缓存加载）"""
+    global _headers_pool
+    with _headers_pool_lock:
+        if _headers_pool is None:
+            _headers_pool = [{"User-Agent": ua} for ua in load_user_agents()]
+        return _headers_pool
+
 
 def get_random_header():
     """随机获取请求头"""
-    return random.choice(HEADERS_POOL)
+    return random.choice(get_headers_pool())
 
 
 def get_random_proxy():
@@ -33,21 +86,36 @@ def get_random_proxy():
 
 
 def request_with_retry(url, method="get", max_retries=3, **kwargs):
-    """带重试机制的请求函数，处理反爬和网络异常"""
+    """带重试机制的请求函数，处理反爬和网络异常（请求间隔由按主机自适应的限速器控制）"""
+    import requests
     kwargs.setdefault("headers", get_random_header())
     kwargs.setdefault("proxies", get_random_proxy())
     kwargs.setdefault("timeout", 10)
+    limiter = get_rate_limiter()
+    host = urlsplit(url).netloc
 
     for i in range(max_retries):
+        limiter.acquire(url)
+        start = time.perf_counter()
         try:
             response = requests.request(method, url, **kwargs)
-            if response.status_code == 200:
-                response.encoding = response.apparent_encoding  # 自动识别编码
-                return response
-            print(f"请求失败 [状态码: {response.status_code}]，重试第{i+1}次...")
         except Exception as e:
+            limiter.feedback(url, error=True)
+            metrics.inc('http_requests_total', host=host, status='error')
             print(f"请求异常 [{str(e)}]，重试第{i+1}次...")
-        time.sleep(random.uniform(1, 3))  # 随机间隔，降低反爬风险
+            continue
+
+        latency = time.perf_counter() - start
+        metrics.observe('http_request_seconds', latency, host=host)
+        metrics.inc('http_requests_total', host=host, status=response.status_code)
+        if response.status_code == 200:
+            response.encoding = response.apparent_encoding  # 自动识别编码
+            if not limiter.feedback(url, status=200, latency=latency, text=response.text):
+                return response
+            print(f"请求被拦截 [验证页]，重试第{i+1}次...")
+        else:
+            limiter.feedback(url, status=response.status_code, latency=latency)
+            print(f"请求失败 [状态码: {response.status_code}]，重试第{i+1}次...")
     return None
 
 
@@ -58,11 +126,32 @@ def create_dir(path):
     return path
 
 
+def sha256_of_file(path, chunk_size=64 * 1024):
+    """分块计算文件的SHA-256，返回hashlib对象（可继续update）"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher
+
+
+def normalize_text(text):
+    """规范化文本（全角转半角、去首尾空白、合并连续空白），用于缓存与去重"""
+    text = unicodedata.normalize("NFKC", str(text or ""))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_hash(text):
+    """规范化文本的哈希值，作为打分/分词缓存的键"""
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
 def save_to_csv(data_list, csv_path, columns):
     """通用CSV保存函数"""
     if not data_list:
         print(f"无数据可保存到 {csv_path}")
         return
+    import pandas as pd
     df = pd.DataFrame(data_list, columns=columns)
     df.to_csv(csv_path, index=False, encoding="utf-8-sig")
     print(f"数据已保存到: {csv_path}")
@@ -70,11 +159,30 @@ def save_to_csv(data_list, csv_path, columns):
 
 def parse_html(response):
     """解析HTML为BeautifulSoup对象"""
+    from bs4 import BeautifulSoup
     return BeautifulSoup(response.text, "lxml")
 
 
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def get_chromedriver_path():
+    """获取chromedriver路径（进程内只执行一次安装检查）"""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
 def get_chrome_browser(headless=False):
     """获取Chrome浏览器实例"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
     if headless:
         chrome_options.add_argument("--headless")  # 无头模式
@@ -83,7 +191,7 @@ def get_chrome_browser(headless=False):
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument(f"user-agent={get_random_header()['User-Agent']}")
 
-    service = Service(ChromeDriverManager().install())
+    service = Service(get_chromedriver_path())
     browser = webdriver.Chrome(service=service, options=chrome_options)
     browser.set_page_load_timeout(SELENIUM_TIMEOUT)
     return browser